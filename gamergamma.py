@@ -4,30 +4,541 @@ import json, re
 import subprocess
 import os, subprocess, shutil
 import webbrowser
+import argparse, threading, queue
+import ctypes, ctypes.util, struct
+import atexit, cProfile, functools, gzip, signal, time
+from collections import namedtuple, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from pynput import keyboard as pynput_keyboard
 
+try:
+    import numpy as np
+except ImportError:  # Optional: only adaptive presets need it
+    np = None
+
 VERSION = "0.4.0"
 MAINTAINERS = ["Animosity"]
 
 CONFIG_FILE = "gg_presets.json"
+RESTORE_JOURNAL = "gg_restore_journal.json"
 _deps = {}
 _hotkey_listener = None
 _hotkey_map = {}
+_hotkey_events = queue.SimpleQueue()    # Key hook -> dispatcher thread
+_hotkey_feedback = queue.SimpleQueue()  # Dispatcher -> Tk loop (preset ids to throb)
+_show_hotkey_feedback = True  # False while the window is torn down (idle mode)
+_hotkey_dispatcher = None
+_apply_plans = {}
+_known_monitors = None
+_applied_state = {}  # display -> {VCP code / "nvibrant": value} last written
+_monitor_entries = {}  # display -> saved "monitors" entry from gg_presets.json
+_staged_reverts = {}  # display -> ApplyPlan undoing a held momentary preset
+_last_apply = 0.0  # time.monotonic() of the last run_apply_plan()
+_restore_on_exit = False  # settings["restore_on_exit"]
+_exit_restore_plans = {}  # display -> precomputed ApplyPlan back to saved state
+_exit_restore_lock = threading.Lock()
+_ddc_timing = {}  # display -> calibrated ddcutil --sleep-multiplier
+_ddc_multi_setvcp = True  # False if this ddcutil takes one feature per setvcp
+_tracer = None  # Set by --profile
+
+DDC_SLEEP_MIN = 0.1   # Fastest ddcutil sleep multiplier calibration will try
+DDC_SLEEP_MAX = 2.0   # ddcutil default is 1.0; some panels need more
+DDC_TIMING_MARGIN = 1.2  # Headroom added on top of the fastest passing value
+DDCUTIL_MULTI_SETVCP = (1, 2)  # First ddcutil release taking several pairs per setvcp
+
+COMMAND_TIMEOUT = 10.0   # Seconds before a hung ddcutil/nvibrant is killed
+DETECT_TIMEOUT = 30.0    # `ddcutil detect` probes every bus; give it longer
+MAX_CONCURRENT_COMMANDS = 4
+HOTKEY_FEEDBACK_POLL_MS = 50  # Upper bound on hotkey -> title throb latency
+# Each `ddcutil -d N setvcp` detects displays before writing, often >1 s
+EXIT_RESTORE_BUDGET = 4.0     # Seconds restore-on-exit commands may take before giving up
+EXIT_SETTLE_TIMEOUT = 0.5     # Seconds exit waits for in-flight applies before killing them
+RESUME_RESTORE_BUDGET = 15.0  # Startup resume of a journaled restore; nothing else waits on it
+
+ADAPTIVE_INTERVAL = 1.0       # Seconds between sampled frames
+ADAPTIVE_CPU_BUDGET = 0.02    # Max share of the interval spent capturing + analysing a frame
+ADAPTIVE_MAX_INTERVAL = 10.0  # Back-off ceiling when capturing is slow
+ADAPTIVE_MANUAL_HOLDOFF = 15.0  # Seconds to stay out of the way after a manual apply
+
+DRIFT_MIN_INTERVAL = 5.0    # Seconds between drift reads right after a change
+DRIFT_MAX_INTERVAL = 120.0  # Back-off ceiling while nothing changes
+DRIFT_SETTLE = 2.0          # Don't read back within this long of an apply
 
 DEFAULT_PRESETS = {
-    "1": {"gamma": 128, "vibrance": 0, "vibrance_mode": "nvidia", "hotkey": "alt+1"},
-    "2": {"gamma": 144, "vibrance": 512, "vibrance_mode": "nvidia", "hotkey": "alt+2"},
-    "3": {"gamma": 255, "vibrance": 1023, "vibrance_mode": "nvidia", "hotkey": "alt+3"},
+    "1": {"gamma": 128, "vibrance": 0, "vibrance_mode": "nvidia", "hotkey": "alt+1", "hotkey_mode": "press"},
+    "2": {"gamma": 144, "vibrance": 512, "vibrance_mode": "nvidia", "hotkey": "alt+2", "hotkey_mode": "press"},
+    "3": {"gamma": 255, "vibrance": 1023, "vibrance_mode": "nvidia", "hotkey": "alt+3", "hotkey_mode": "press"},
 }
 
 
+# ----------------------------
+# Profiling (--profile)
+# ----------------------------
+# Spans are written as Chrome trace / Perfetto JSON ("X" complete events),
+# so a slow launch can be attached to a bug report and opened in
+# ui.perfetto.dev or chrome://tracing. With no tracer installed, spans cost
+# a generator and a None check.
+
+class Tracer:
+    def __init__(self, path, cprofile=False):
+        self.path = path
+        self.events = []
+        self.thread_names = {}
+        self.origin = time.perf_counter_ns()
+        self.pid = os.getpid()
+        self.profiler = cProfile.Profile() if cprofile else None
+        if self.profiler:
+            self.profiler.enable()
+
+    def add(self, name, cat, start_ns, end_ns, args):
+        thread = threading.current_thread()
+        self.thread_names.setdefault(thread.ident, thread.name)
+        self.events.append({
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": (start_ns - self.origin) / 1000,
+            "dur": (end_ns - start_ns) / 1000,
+            "pid": self.pid,
+            "tid": thread.ident,
+            "args": args,
+        })
+
+    def instant(self, name, cat):
+        self.events.append({
+            "name": name,
+            "cat": cat,
+            "ph": "i",
+            "s": "g",
+            "ts": (time.perf_counter_ns() - self.origin) / 1000,
+            "pid": self.pid,
+            "tid": threading.get_ident(),
+        })
+
+    def counter(self, name, cat, values):
+        self.events.append({
+            "name": name,
+            "cat": cat,
+            "ph": "C",
+            "ts": (time.perf_counter_ns() - self.origin) / 1000,
+            "pid": self.pid,
+            "args": values,
+        })
+
+    def write(self):
+        """Writes the trace (and <trace>.prof if cProfile was on)."""
+        meta = [
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid,
+             "args": {"name": name}}
+            for tid, name in self.thread_names.items()
+        ]
+        with open(self.path, "w") as f:
+            json.dump({
+                "traceEvents": meta + self.events,
+                "displayTimeUnit": "ms",
+                "otherData": {"commands": _supervisor.stats()},
+            }, f)
+        print(f"Profile trace written to {self.path}")
+
+        if self.profiler:
+            self.profiler.disable()
+            prof_path = os.path.splitext(self.path)[0] + ".prof"
+            self.profiler.dump_stats(prof_path)
+            print(f"Python profile written to {prof_path}")
+
+
+def start_profiling(path, cprofile=False):
+    global _tracer
+    _tracer = Tracer(path, cprofile)
+    atexit.register(_tracer.write)
+
+
+@contextmanager
+def trace_span(name, cat="startup", **args):
+    if _tracer is None:
+        yield
+        return
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        _tracer.add(name, cat, start, time.perf_counter_ns(), args)
+
+
+def trace_instant(name, cat="startup"):
+    if _tracer is not None:
+        _tracer.instant(name, cat)
+
+
+def trace_counter(name, cat="background", **values):
+    if _tracer is not None:
+        _tracer.counter(name, cat, values)
+
+
+def trace_command(argv):
+    """Span around one external command (ddcutil/nvibrant)."""
+    return trace_span(argv[0], cat="command", argv=" ".join(argv))
+
+
+def traced(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _tracer is None:
+            return func(*args, **kwargs)
+        with trace_span(func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+# ----------------------------
+# Command record / replay
+# ----------------------------
+# Monitors differ wildly in latency, NAKs and CRC failures. --record captures
+# every command the supervisor runs (argv, exit code, output, duration) as
+# JSON lines (gzip if the name ends in .gz); --replay answers commands from
+# such a trace with the recorded output and timing instead of touching
+# hardware, so another user's panel can be reproduced locally.
+
+TRACE_FORMAT = "gamergamma-commands/1"
+
+
+def _open_trace(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t")
+    return open(path, mode)
+
+
+def _loose_command_key(argv):
+    """Fallback replay key ignoring --sleep-multiplier, which differs per machine."""
+    argv = list(argv)
+    if "--sleep-multiplier" in argv:
+        i = argv.index("--sleep-multiplier")
+        del argv[i:i + 2]
+    return tuple(argv)
+
+
+class CommandRecorder:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = _open_trace(path, "w")
+        self._write({"format": TRACE_FORMAT, "version": VERSION})
+
+    def _write(self, entry):
+        # One line per command, flushed, so a crash keeps what was captured.
+        # A gzip trace then lacks its end-of-stream marker; CommandReplay
+        # reads it up to the last complete line.
+        with self._lock:
+            self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self._file.flush()
+
+    def record(self, argv, returncode, out, err, seconds, timed_out=False):
+        entry = {"argv": list(argv), "rc": returncode, "ms": round(seconds * 1000, 3)}
+        if out:
+            entry["out"] = out
+        if err:
+            entry["err"] = err
+        if timed_out:
+            entry["timeout"] = True
+        self._write(entry)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class CommandReplay:
+    """
+    Answers commands from a recorded trace. Responses for the same argv are
+    served in recorded order; the last one repeats once they run out. An
+    argv that was never recorded falls back to one that only differs in
+    --sleep-multiplier. speed scales recorded durations (0 = no sleeping,
+    for fast tests).
+    """
+    def __init__(self, path, speed=1.0):
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._responses = {}
+        self._loose_responses = {}
+        with _open_trace(path, "r") as f:
+            header = json.loads(f.readline())
+            if header.get("format") != TRACE_FORMAT:
+                raise ValueError(f"{path} is not a gamergamma command trace")
+            for entry in self._read_entries(f):
+                argv = entry["argv"]
+                self._responses.setdefault(tuple(argv), deque()).append(entry)
+                self._loose_responses.setdefault(_loose_command_key(argv), deque()).append(entry)
+
+    @staticmethod
+    def _read_entries(f):
+        """
+        Yields recorded entries up to the last complete line. A recording
+        cut short by a crash or kill ends mid-line, or (gzip) without its
+        end-of-stream marker; what came before is still usable.
+        """
+        try:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    if line.endswith("\n"):
+                        raise
+                    return  # Truncated final line
+        except EOFError:
+            return
+
+    def has_tool(self, name):
+        return any(key[0] == name for key in self._responses)
+
+    def _next(self, argv):
+        with self._lock:
+            responses = self._responses.get(tuple(argv))
+            if not responses:
+                responses = self._loose_responses.get(_loose_command_key(argv))
+            if not responses:
+                return None
+            return responses.popleft() if len(responses) > 1 else responses[0]
+
+    def respond(self, argv, timeout):
+        """Returns (returncode, stdout, stderr) after the recorded delay."""
+        entry = self._next(argv)
+        if entry is None:
+            return 1, "", f"replay: no recorded response for {' '.join(argv)}"
+
+        delay = entry["ms"] / 1000 * self.speed
+        if entry.get("timeout") or (timeout is not None and delay > timeout):
+            time.sleep(min(delay, timeout or delay))
+            raise subprocess.TimeoutExpired(argv, timeout)
+        time.sleep(delay)
+
+        if entry["rc"] is None:
+            raise FileNotFoundError(entry.get("err", argv[0]))
+        return entry["rc"], entry.get("out", ""), entry.get("err")
+
+
+# ----------------------------
+# Command supervisor
+# ----------------------------
+# Every ddcutil/nvibrant invocation goes through _supervisor, which reaps each
+# child, kills it after its timeout, serializes commands per bus (one DDC
+# display, or the GPU for nvibrant) and caps how many run at once. Fire-and-
+# forget commands run on a small worker pool instead of orphaned Popens; each
+# bus drains its own FIFO, so writes reach a monitor in the order sent.
+
+class SupervisorClosed(OSError):
+    """Raised by CommandSupervisor.run() once shutdown() has been called."""
+
+
+class CommandSupervisor:
+    def __init__(self, max_concurrent=MAX_CONCURRENT_COMMANDS, timeout=COMMAND_TIMEOUT):
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._bus_locks = {}
+        self._bus_queues = {}  # bus -> submitted commands; present while a worker drains it
+        self._procs = set()    # Children currently running, for shutdown()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_concurrent, thread_name_prefix="gg-command")
+        self._counts = {"running": 0, "completed": 0, "failed": 0, "timed_out": 0}
+        self.recorder = None  # CommandRecorder, set by --record
+        self.replay = None    # CommandReplay, set by --replay
+
+    @staticmethod
+    def command_bus(argv):
+        """Which bus a command talks over; commands on one bus never overlap."""
+        if argv[0] == "ddcutil" and "-d" in argv:
+            return f"ddc:{argv[argv.index('-d') + 1]}"
+        if argv[0] == "nvibrant":
+            return "nvibrant"
+        return None
+
+    def _bus_lock(self, bus):
+        with self._lock:
+            return self._bus_locks.setdefault(bus, threading.Lock())
+
+    def _count(self, key, delta=1):
+        with self._lock:
+            self._counts[key] += delta
+
+    def stats(self):
+        """Snapshot of running/completed/failed/timed_out command counts."""
+        with self._lock:
+            return dict(self._counts)
+
+    def run(self, argv, timeout=None, stderr=subprocess.PIPE, text=True):
+        """
+        Runs a command to completion (or until killed at its timeout).
+
+        Returns:
+            subprocess.CompletedProcess with text (or, text=False, bytes) output
+
+        Raises:
+            subprocess.TimeoutExpired, OSError (SupervisorClosed after shutdown())
+        """
+        timeout = self.timeout if timeout is None else timeout
+        bus = self.command_bus(argv)
+        bus_lock = self._bus_lock(bus) if bus else None
+
+        if bus_lock:
+            bus_lock.acquire()
+        self._slots.acquire()
+        try:
+            with self._lock:
+                # Checked with the bus held: a command that waited out a
+                # shutdown() must not reach the bus after it
+                if self._closed:
+                    raise SupervisorClosed(f"supervisor shut down; not running {argv[0]}")
+                self._counts["running"] += 1
+            try:
+                with trace_command(argv):
+                    if self.replay:
+                        returncode, out, err = self.replay.respond(argv, timeout)
+                        if not text:
+                            out = out.encode()
+                    else:
+                        returncode, out, err = self._spawn(argv, timeout, stderr, text)
+            except subprocess.TimeoutExpired:
+                self._count("timed_out")
+                raise
+            except OSError:
+                self._count("failed")
+                raise
+            finally:
+                self._count("running", -1)
+        finally:
+            self._slots.release()
+            if bus_lock:
+                bus_lock.release()
+
+        self._count("completed" if returncode == 0 else "failed")
+        return subprocess.CompletedProcess(argv, returncode, out, err)
+
+    def _spawn(self, argv, timeout, stderr, text=True):
+        start = time.perf_counter()
+        try:
+            proc = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=stderr, text=text)
+        except OSError as e:
+            if self.recorder:
+                self.recorder.record(argv, None, "", str(e), time.perf_counter() - start)
+            raise
+        with self._lock:
+            if self._closed:
+                proc.kill()  # Started as shutdown() swept; don't let it write
+            self._procs.add(proc)
+        try:
+            out, err = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()  # Reap
+            if self.recorder:
+                self.recorder.record(argv, None, "", None, time.perf_counter() - start,
+                                     timed_out=True)
+            raise
+        finally:
+            with self._lock:
+                self._procs.discard(proc)
+        if self.recorder:
+            # Binary output (screen captures) is timing-only in the trace
+            self.recorder.record(
+                argv, proc.returncode, out if text else None,
+                err if text else None, time.perf_counter() - start
+            )
+        return proc.returncode, out, err
+
+    def check_output(self, argv, timeout=None, stderr=subprocess.PIPE):
+        """Like subprocess.check_output(text=True), but supervised."""
+        result = self.run(argv, timeout=timeout, stderr=stderr)
+        if result.returncode != 0:
+            raise subprocess.CalledProcessError(
+                result.returncode, argv, result.stdout, result.stderr
+            )
+        return result.stdout
+
+    def submit(self, argv, timeout=None, on_failure=None):
+        """
+        Runs a command in the background; returns a Future. Commands for one
+        bus run one at a time in submission order, so the last write sent to
+        a monitor is the one it ends up with. on_failure(argv) is called, on
+        the same worker before the bus's next command, if the command exits
+        non-zero.
+        """
+        bus = self.command_bus(argv)
+        future = Future()
+        with self._lock:
+            if self._closed:
+                future.cancel()
+                return future
+            if bus is None:
+                return self._pool.submit(self._run_quietly, argv, timeout, on_failure)
+            pending = self._bus_queues.get(bus)
+            start_worker = pending is None
+            if start_worker:
+                pending = self._bus_queues[bus] = deque()
+            pending.append((argv, timeout, on_failure, future))
+        if start_worker:
+            self._pool.submit(self._drain_bus, bus)
+        return future
+
+    def _drain_bus(self, bus):
+        while True:
+            with self._lock:
+                pending = self._bus_queues[bus]
+                if not pending:
+                    del self._bus_queues[bus]
+                    return
+                argv, timeout, on_failure, future = pending.popleft()
+            if future.set_running_or_notify_cancel():
+                future.set_result(self._run_quietly(argv, timeout, on_failure))
+
+    def shutdown(self, timeout=0.0):
+        """
+        Stops taking background commands and drops the ones not yet
+        started. Commands already running get up to `timeout` seconds, then
+        are killed, so none of them can land on a bus after whatever the
+        caller sends next.
+        """
+        with self._lock:
+            self._closed = True
+            dropped = [future for pending in self._bus_queues.values()
+                       for _, _, _, future in pending]
+            for pending in self._bus_queues.values():
+                pending.clear()
+        for future in dropped:
+            future.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+        deadline = time.monotonic() + timeout
+        while self.stats()["running"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with self._lock:
+            stragglers = list(self._procs)
+        for proc in stragglers:
+            proc.kill()
+
+    def _run_quietly(self, argv, timeout, on_failure=None):
+        try:
+            result = self.run(argv, timeout=timeout, stderr=subprocess.DEVNULL)
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        if on_failure and result.returncode != 0:
+            on_failure(argv)
+        return result
+
+
+_supervisor = CommandSupervisor()
+
+
 # ----------------------------
 # Utility functions
 # ----------------------------
 
+@traced
 def detect_monitors():
     try:
-        out = subprocess.check_output(["ddcutil", "detect"], text=True)
+        out = _supervisor.check_output(["ddcutil", "detect"], timeout=DETECT_TIMEOUT)
     except Exception:
         return []
 
@@ -44,9 +555,110 @@ def detect_monitors():
             monitors.append((current_index, name))
             current_index = None
 
+    # Apply plans bake in monitor indices; drop them if the mapping moved.
+    global _known_monitors
+    if monitors != _known_monitors:
+        if _known_monitors is not None:
+            invalidate_apply_plans()
+        _known_monitors = monitors
+
     return monitors
 
 
+# Order VCP features are written in when several go to one monitor at once.
+VCP_WRITE_ORDER = ("0x10", "0x12", "0x72", "0x8A")
+
+
+def ddcutil_args(display, *args, multiplier=None):
+    """
+    Builds a ddcutil argv for a display, including the monitor's calibrated
+    sleep multiplier (see calibrate_ddc_timing()) when one is known, or
+    `multiplier` if given.
+    """
+    argv = ["ddcutil", "-d", str(display)]
+    if multiplier is None:
+        multiplier = _ddc_timing.get(str(display))
+    if multiplier is not None:
+        argv += ["--sleep-multiplier", f"{multiplier:g}"]
+    return argv + list(args)
+
+
+def ddcutil_setvcp_args(display, values):
+    """
+    Builds a single `ddcutil setvcp` argv writing several features in
+    VCP_WRITE_ORDER, e.g. `setvcp 0x72 0x9000 0x8A 50`, so one monitor costs
+    one process and one bus session instead of racing invocations.
+
+    values: dict of VCP code -> value string
+    """
+    pairs = []
+    for code in VCP_WRITE_ORDER:
+        if code in values:
+            pairs += [code, values[code]]
+    return ddcutil_args(display, "setvcp", *pairs)
+
+
+def ddcutil_setvcp_commands(display, values):
+    """
+    The argvs writing `values` to a display: one multi-pair setvcp, or one
+    setvcp per feature (in VCP_WRITE_ORDER) on a ddcutil too old for that.
+    """
+    if _ddc_multi_setvcp:
+        return [ddcutil_setvcp_args(display, values)]
+    return [
+        ddcutil_setvcp_args(display, {code: values[code]})
+        for code in VCP_WRITE_ORDER if code in values
+    ]
+
+
+def split_setvcp_args(argv):
+    """
+    Splits a multi-pair `ddcutil setvcp` argv into one argv per pair.
+    Returns [] for anything else, including a single-pair setvcp.
+    """
+    if argv[0] != "ddcutil" or "setvcp" not in argv:
+        return []
+    i = argv.index("setvcp") + 1
+    pairs = argv[i:]
+    if len(pairs) <= 2:
+        return []
+    return [tuple(argv[:i]) + tuple(pairs[j:j + 2]) for j in range(0, len(pairs), 2)]
+
+
+def ddcutil_supports_multi_setvcp(version):
+    """True unless `ddcutil --version` names a release before DDCUTIL_MULTI_SETVCP."""
+    m = re.search(r"(\d+)\.(\d+)", version or "")
+    return m is None or tuple(map(int, m.groups())) >= DDCUTIL_MULTI_SETVCP
+
+
+def retry_setvcp_singly(argv):
+    """
+    Re-sends a failed multi-pair setvcp one feature at a time, so a build
+    that rejects several pairs (or a monitor refusing one feature) still
+    gets the rest. If every single write works, the multi-pair form was the
+    problem, and plans are recompiled to skip it from now on.
+
+    Returns:
+        True if every single write succeeded
+    """
+    global _ddc_multi_setvcp
+    singles = split_setvcp_args(argv)
+    if not singles:
+        return False
+    ok = True
+    for single in singles:
+        try:
+            ok &= _supervisor.run(single, stderr=subprocess.DEVNULL).returncode == 0
+        except (OSError, subprocess.TimeoutExpired):
+            ok = False
+    if ok and _ddc_multi_setvcp:
+        print("ddcutil rejected several features in one setvcp; writing them one at a time.")
+        _ddc_multi_setvcp = False
+        invalidate_apply_plans()
+    return ok
+
+
+@traced
 def load_presets():
     if not os.path.exists(CONFIG_FILE):
         # Initialize with per-monitor structure
@@ -63,6 +675,8 @@ def load_presets():
                 "3": DEFAULT_PRESETS["3"].copy(),
             }
         save_presets(data)
+        data["settings"] = {}
+        load_monitor_entries(data)
         return data
 
     with open(CONFIG_FILE, "r") as f:
@@ -102,13 +716,70 @@ def load_presets():
                 data["presets"][display_key][pid].setdefault(k, v)
 
     data.setdefault("monitors", {})
+    data.setdefault("settings", {})
+    load_monitor_entries(data)
     return data
 
 
+def load_monitor_entries(data):
+    """
+    Caches the config's per-monitor entries (saved VCP state and calibrated
+    timing) so hot paths don't have to re-read gg_presets.json.
+    """
+    _monitor_entries.clear()
+    _monitor_entries.update(data.get("monitors", {}))
+
+    timing = {
+        display: entry["sleep_multiplier"]
+        for display, entry in data.get("monitors", {}).items()
+        if entry.get("sleep_multiplier") is not None
+    }
+    if timing != _ddc_timing:
+        _ddc_timing.clear()
+        _ddc_timing.update(timing)
+        invalidate_apply_plans()  # Plans bake in the ddcutil argv
+
+    # Saved state or timing may have changed under the restore-on-exit plans
+    with _exit_restore_lock:
+        for display, plan in list(_exit_restore_plans.items()):
+            _exit_restore_plans[display] = _exit_restore_plan(
+                display, "nvibrant" in dict(plan.values)
+            )
+        if _restore_on_exit and _exit_restore_plans:
+            _write_restore_journal()
+
+
 def save_presets(data):
     with open(CONFIG_FILE, "w") as f:
         json.dump(data, f, indent=4)
 
+
+def _config_for_update(what):
+    """
+    Reads gg_presets.json for a targeted update, without load_presets()'s
+    monitor detection (which can block for seconds). Returns None, after
+    saying so, if the file is unreadable.
+    """
+    if not os.path.exists(CONFIG_FILE):
+        load_presets()  # Writes the initial config
+    data = read_config_file()
+    if data is None:
+        print(f"Could not save {what}: {CONFIG_FILE} is unreadable")
+    return data
+
+
+def save_setting(key, value):
+    """
+    Persists one app option under "settings" in gg_presets.json, leaving
+    the rest of the file as it is on disk.
+    """
+    data = _config_for_update(f"setting {key!r}")
+    if data is None:
+        return
+    data.setdefault("settings", {})[key] = value
+    save_presets(data)
+
+@traced
 def check_linux_dependencies():
     """
     Checks for required Linux dependencies: ddcutil and nvibrant.
@@ -123,17 +794,20 @@ def check_linux_dependencies():
     results = {}
 
     for dep in deps:
-        path = shutil.which(dep)
+        if _supervisor.replay:
+            # Replaying another machine's hardware: its tools "exist" here
+            path = dep if _supervisor.replay.has_tool(dep) else None
+        else:
+            path = shutil.which(dep)
         installed = path is not None
         version = None
 
         if installed:
             try:
                 # Most CLI tools support --version; suppress stderr just in case
-                version = subprocess.check_output(
+                version = _supervisor.check_output(
                     [dep, "--version"],
-                    stderr=subprocess.DEVNULL,
-                    text=True
+                    stderr=subprocess.DEVNULL
                 ).strip()
             except Exception:
                 # Tool exists but doesn't support --version or failed
@@ -147,6 +821,7 @@ def check_linux_dependencies():
 
     return results
 
+@traced
 def fetch_monitor_vcp_state():
     """
     Fetches Brightness, Contrast, Gamma (sh byte), and Vibrance
@@ -169,12 +844,9 @@ def fetch_monitor_vcp_state():
         entry = {"name": name}
 
         for key, code in VCP_CODES.items():
+            argv = ddcutil_args(display, "getvcp", code)
             try:
-                out = subprocess.check_output(
-                    ["ddcutil", "getvcp", code, "--display", str(display)],
-                    stderr=subprocess.STDOUT,
-                    text=True
-                )
+                out = _supervisor.check_output(argv, stderr=subprocess.STDOUT)
             except Exception:
                 continue
 
@@ -200,10 +872,11 @@ def fetch_monitor_vcp_state():
 
     return state
 
+@traced
 def restore_monitor_state(display):
     """
     Restores saved monitor VCP state (Brightness, Contrast, Gamma, Vibrance)
-    using ddcutil setvcp from gg_presets.json
+    from gg_presets.json using one multi-feature ddcutil setvcp
     """
     try:
         with open(CONFIG_FILE, "r") as f:
@@ -216,34 +889,7 @@ def restore_monitor_state(display):
     if not entry:
         return
 
-    # Brightness
-    if "brightness" in entry:
-        subprocess.Popen([
-            "ddcutil", "-d", str(display),
-            "setvcp", "0x10", str(entry["brightness"])
-        ])
-
-    # Contrast
-    if "contrast" in entry:
-        subprocess.Popen([
-            "ddcutil", "-d", str(display),
-            "setvcp", "0x12", str(entry["contrast"])
-        ])
-
-    # Gamma (restore sh byte only; lsbyte forced to 0x00)
-    if "gamma_sh" in entry:
-        gamma_hex = f"0x{entry['gamma_sh']:02X}00"
-        subprocess.Popen([
-            "ddcutil", "-d", str(display),
-            "setvcp", "0x72", gamma_hex
-        ])
-
-    # Vibrance / Color Saturation
-    if "vibrance" in entry:
-        subprocess.Popen([
-            "ddcutil", "-d", str(display),
-            "setvcp", "0x8A", str(entry["vibrance"])
-        ])
+    run_apply_plan(compile_restore_plan(display, entry), restoring=True)
 
 def get_monitor_vcp_limits(display):
     try:
@@ -309,35 +955,967 @@ def apply_preset(display, gamma, vibrance_mode, vibrance):
 
 
     """
-    global _deps
+    run_apply_plan(compile_apply_plan(display, gamma, vibrance_mode, vibrance))
+
+
+# ----------------------------
+# Apply plans
+# ----------------------------
+# An ApplyPlan is the fully-resolved list of argv vectors for one preset on
+# one display. Plans are compiled when a preset is saved/loaded so a hotkey
+# press only has to spawn the prebuilt commands.
+
+# `values` records what the plan writes, as (key, value) pairs: VCP codes
+# ("0x72": "0x9000") and "nvibrant" (the full vibrance vector). It is what
+# momentary hotkeys use to stage an exact revert.
+ApplyPlan = namedtuple("ApplyPlan", ["display", "commands", "values"])
+
+
+def compile_values_plan(display, values):
+    """Builds an ApplyPlan writing `values` (see ApplyPlan) to a display."""
+    display = int(display)
+    commands = []
+
+    # All DDC features for the monitor go out in one ddcutil transaction
+    # (one per feature on an old ddcutil; see ddcutil_setvcp_commands())
+    ddc_values = {k: v for k, v in values.items() if k != "nvibrant"}
+    if ddc_values:
+        commands += [tuple(argv) for argv in ddcutil_setvcp_commands(display, ddc_values)]
+    if "nvibrant" in values:
+        commands.append(("nvibrant",) + tuple(values["nvibrant"]))
+
+    return ApplyPlan(display, tuple(commands), tuple(values.items()))
+
+
+def compile_apply_plan(display, gamma, vibrance_mode, vibrance):
+    """
+    Resolves a preset into an immutable ApplyPlan, checking tool
+    availability once. See apply_preset() Notes (1-3) for the formats.
+    """
+    display = int(display)
+    has_ddcutil = _deps.get("ddcutil", {}).get("installed")
+    has_nvibrant = _deps.get("nvibrant", {}).get("installed")
+    values = {}
+
     # Apply monitor gamma via ddcutil if installed.
     # See Notes (1-2).
-    if _deps.get("ddcutil", {}).get("installed"):
-        subprocess.Popen([
-            "ddcutil",
-            "-d", str(display),
-            "setvcp", "0x72", f"0x{gamma:02X}00"
-        ])
-
+    if has_ddcutil:
+        values["0x72"] = f"0x{int(gamma):02X}00"
 
     # Apply NVIDIA vibrance if nvibrant is installed
     if vibrance_mode == "nvidia":
-        if _deps.get("nvibrant", {}).get("installed"):
-            cmd = ["nvibrant"] + ["0"] * 7 # See Note (3).
-            # The parameter position is 2n-1 but it is already offset by the nvibrant string.
-            # Insert vibrance value into monitor-relative parameter position
-            cmd[2*display] = str(vibrance)
-            subprocess.Popen(cmd)
+        if has_nvibrant:
+            vector = ["0"] * 7 # See Note (3).
+            # Insert vibrance value into monitor-relative parameter position (2n-1)
+            slot = 2*display - 1
+            if 0 < slot < len(vector):
+                vector[slot] = str(vibrance)
+                values["nvibrant"] = tuple(vector)
+            else:
+                # Past the outputs nvibrant reports (see Note (3)); gamma still applies
+                print(f"nvibrant: display {display} has no vibrance slot; skipping vibrance")
 
     elif vibrance_mode == "ddc":
-        if _deps.get("ddcutil", {}).get("installed"):
+        if has_ddcutil:
             # TODO - Add VCP capabilities check + status bar update here.
-            # VCP 0x10 = color saturation
-            subprocess.Popen([
-                "ddcutil",
-                "-d", str(display),
-                "setvcp", "0x8A", str(vibrance)
-            ])
+            # VCP 0x8A = color saturation
+            values["0x8A"] = str(vibrance)
+
+    return compile_values_plan(display, values)
+
+
+def compile_restore_plan(display, entry):
+    """
+    Resolves a saved monitor state entry (see fetch_monitor_vcp_state())
+    into an ApplyPlan that restores it in a single ddcutil transaction.
+    """
+    values = {}
+    if "brightness" in entry:
+        values["0x10"] = str(entry["brightness"])
+    if "contrast" in entry:
+        values["0x12"] = str(entry["contrast"])
+    # Gamma (restore sh byte only; lsbyte forced to 0x00)
+    if "gamma_sh" in entry:
+        values["0x72"] = f"0x{entry['gamma_sh']:02X}00"
+    # Vibrance / Color Saturation
+    if "vibrance" in entry:
+        values["0x8A"] = str(entry["vibrance"])
+
+    return compile_values_plan(display, values)
+
+
+def run_apply_plan(plan, restoring=False):
+    """
+    Sends a plan through the supervisor. restoring=True marks a plan that
+    puts the display back to its saved state (see compile_restore_plan()).
+    """
+    global _last_apply
+    _last_apply = time.monotonic()
+    # Remember what each display was last set to, for momentary reverts
+    _applied_state.setdefault(str(plan.display), {}).update(plan.values)
+    track_exit_restore(plan, restoring)
+    for argv in plan.commands:
+        # A rejected multi-pair setvcp is retried singly before the bus moves on
+        on_failure = retry_setvcp_singly if split_setvcp_args(argv) else None
+        _supervisor.submit(argv, on_failure=on_failure)
+
+
+def stage_revert_plan(plan, pending=None):
+    """
+    Pre-compiles the plan that undoes `plan`: every value it writes goes
+    back to what the display was last set to (including a `pending` plan
+    not yet sent). Values never set by us fall back to the monitor state
+    saved in gg_presets.json, and NVIDIA vibrance to 0.
+    """
+    display = str(plan.display)
+    current = dict(_applied_state.get(display, {}))
+    if pending is not None:
+        current.update(pending.values)
+    baseline = dict(compile_restore_plan(display, _monitor_entries.get(display, {})).values)
+
+    values = {}
+    for key, _ in plan.values:
+        if key in current:
+            values[key] = current[key]
+        elif key in baseline:
+            values[key] = baseline[key]
+        elif key == "nvibrant":
+            values[key] = ("0",) * 7
+
+    return compile_values_plan(display, values)
+
+
+def store_apply_plan(display, preset_id, preset):
+    """Compiles and caches the plan for a saved/loaded preset."""
+    plan = compile_apply_plan(
+        display,
+        preset["gamma"],
+        preset.get("vibrance_mode", "nvidia"),
+        preset["vibrance"]
+    )
+    _apply_plans[(str(display), str(preset_id))] = plan
+    return plan
+
+
+def get_apply_plan(display, preset_id, all_presets):
+    plan = _apply_plans.get((str(display), str(preset_id)))
+    if plan is None:
+        preset = all_presets.get(str(display), {}).get(
+            str(preset_id), DEFAULT_PRESETS[str(preset_id)]
+        )
+        plan = store_apply_plan(display, preset_id, preset)
+    return plan
+
+
+def invalidate_apply_plans(display=None):
+    """Drops cached plans (all, or just one display's) so they recompile."""
+    if display is None:
+        _apply_plans.clear()
+        return
+    for key in [k for k in _apply_plans if k[0] == str(display)]:
+        del _apply_plans[key]
+
+# ----------------------------
+# DDC timing calibration
+# ----------------------------
+# ddcutil sleeps between DDC/CI packets using conservative defaults scaled by
+# --sleep-multiplier. Monitors differ widely in what they tolerate, so we
+# search for the fastest multiplier that still gives clean set/read-back
+# pairs on 0x72 and store it with the monitor's entry in gg_presets.json.
+
+def _read_gamma_sh(display, multiplier):
+    argv = ddcutil_args(display, "getvcp", "0x72", multiplier=multiplier)
+    try:
+        out = _supervisor.check_output(argv, stderr=subprocess.STDOUT)
+    except Exception:
+        return None
+    m = re.search(r"sh=0x([0-9A-Fa-f]{2})", out)
+    return int(m.group(1), 16) if m else None
+
+
+def _write_gamma_sh(display, multiplier, gamma_sh):
+    argv = ddcutil_args(display, "setvcp", "0x72", f"0x{gamma_sh:02X}00",
+                        multiplier=multiplier)
+    try:
+        return _supervisor.run(argv).returncode == 0
+    except Exception:
+        return False
+
+
+def _ddc_roundtrip_ok(display, multiplier, gamma_sh, trials):
+    """
+    Alternates gamma between its current value and one step away, checking
+    each write reads back. Writing the unchanged value would read back fine
+    even if the write had been dropped.
+    """
+    probe = gamma_sh + 1 if gamma_sh < 0xFF else gamma_sh - 1
+    for trial in range(trials):
+        value = probe if trial % 2 == 0 else gamma_sh
+        if not _write_gamma_sh(display, multiplier, value):
+            return False
+        if _read_gamma_sh(display, multiplier) != value:
+            return False
+    return True
+
+
+@traced
+def calibrate_ddc_timing(display, trials=3, steps=5):
+    """
+    Binary-searches the fastest reliable ddcutil sleep multiplier for a
+    display between DDC_SLEEP_MIN and DDC_SLEEP_MAX.
+
+    Probes step gamma by a single unit, so the picture barely changes while
+    calibrating; the original value is written back at the end.
+
+    Returns:
+        float multiplier (with DDC_TIMING_MARGIN applied), or None if the
+        monitor couldn't be driven reliably even at DDC_SLEEP_MAX.
+    """
+    gamma_sh = _read_gamma_sh(display, DDC_SLEEP_MAX)
+    if gamma_sh is None:
+        return None
+    try:
+        if not _ddc_roundtrip_ok(display, DDC_SLEEP_MAX, gamma_sh, trials):
+            return None
+
+        lo, hi = DDC_SLEEP_MIN, DDC_SLEEP_MAX
+        if _ddc_roundtrip_ok(display, lo, gamma_sh, trials):
+            hi = lo
+        else:
+            for _ in range(steps):
+                mid = (lo + hi) / 2
+                if _ddc_roundtrip_ok(display, mid, gamma_sh, trials):
+                    hi = mid
+                else:
+                    lo = mid
+    finally:
+        _write_gamma_sh(display, DDC_SLEEP_MAX, gamma_sh)
+
+    return round(min(DDC_SLEEP_MAX, hi * DDC_TIMING_MARGIN), 2)
+
+
+def save_ddc_timing(display, multiplier):
+    """
+    Stores a calibrated multiplier with the monitor entry and applies it.
+    A failed calibration (None) keeps whatever was calibrated before.
+    """
+    if multiplier is None:
+        return
+    data = _config_for_update(f"DDC timing for display {display}")
+    if data is None:
+        return
+    data.setdefault("monitors", {}).setdefault(str(display), {})["sleep_multiplier"] = multiplier
+    save_presets(data)
+    load_monitor_entries(data)
+
+# ----------------------------
+# Restore on exit
+# ----------------------------
+# With settings["restore_on_exit"], every display we change gets a restore
+# plan precomputed (saved monitor state, plus NVIDIA vibrance 0 if we touched
+# it) the first time it changes. On exit, Tk window close, SIGTERM/SIGINT/
+# SIGHUP those plans are sent, one batched command per monitor, all in
+# parallel and cut off after EXIT_RESTORE_BUDGET. The plans are also
+# journaled to RESTORE_JOURNAL, so if we die before restoring (SIGKILL,
+# crash, X session gone) the next launch finishes the job, with the longer
+# RESUME_RESTORE_BUDGET since nothing is waiting on it then. Under --replay
+# nothing is journaled and restores are answered from the trace: a replayed
+# session's plans belong to another machine's monitors.
+
+_exit_signal = None        # Signal that ended the main loop, for the exit status
+_exit_signal_state = None  # (wakeup read fd, write fd, previous handlers) while handled
+
+def _exit_restore_plan(display, include_nvibrant):
+    entry = _monitor_entries.get(str(display), {})
+    values = dict(compile_restore_plan(display, entry).values)
+    if include_nvibrant:
+        values["nvibrant"] = ("0",) * 7
+    return compile_values_plan(display, values)
+
+
+def _write_restore_journal():
+    if _supervisor.replay:
+        return
+    commands = _exit_restore_commands()
+    if not commands:
+        _remove_restore_journal()
+        return
+    tmp = RESTORE_JOURNAL + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"commands": commands}, f)
+    os.replace(tmp, RESTORE_JOURNAL)
+
+
+def _remove_restore_journal():
+    try:
+        os.remove(RESTORE_JOURNAL)
+    except FileNotFoundError:
+        pass
+
+
+def _exit_restore_commands():
+    """Every command needed to restore changed displays, deduplicated."""
+    commands = []
+    for plan in list(_exit_restore_plans.values()):
+        for argv in plan.commands:
+            if list(argv) not in commands:
+                commands.append(list(argv))
+    return commands
+
+
+def track_exit_restore(plan, restoring=False):
+    """
+    Keeps _exit_restore_plans (and the journal) in step with which displays
+    differ from their saved state. Only does work when that set changes,
+    not on every hotkey press.
+    """
+    display = str(plan.display)
+    with _exit_restore_lock:
+        current = _exit_restore_plans.get(display)
+        if restoring:
+            if current is None:
+                return
+            del _exit_restore_plans[display]
+        else:
+            touches_nvibrant = "nvibrant" in dict(plan.values)
+            if current is not None and (
+                    not touches_nvibrant or "nvibrant" in dict(current.values)):
+                return  # Already covered
+            _exit_restore_plans[display] = _exit_restore_plan(display, touches_nvibrant)
+        if _restore_on_exit:
+            _write_restore_journal()
+
+
+def set_restore_on_exit(enabled):
+    global _restore_on_exit
+    with _exit_restore_lock:
+        _restore_on_exit = enabled
+        atexit.unregister(run_exit_restore)
+        if enabled:
+            atexit.register(run_exit_restore)
+            _write_restore_journal()
+        else:
+            _remove_restore_journal()
+
+
+def run_restore_commands(commands, budget=EXIT_RESTORE_BUDGET):
+    """
+    Starts all commands at once (they target different buses) and waits at
+    most `budget` seconds; stragglers are killed. Bypasses the supervisor's
+    pool on purpose: at exit it is already shut down (see run_exit_restore()).
+    Under --replay the commands are answered from the trace instead.
+
+    Returns:
+        True if every command finished successfully in time
+    """
+    deadline = time.monotonic() + budget
+
+    def run_single(argv):
+        # One command, sequentially, in what is left of the budget
+        timeout = max(0, deadline - time.monotonic())
+        if _supervisor.replay:
+            try:
+                return _supervisor.replay.respond(argv, timeout)[0] == 0
+            except subprocess.TimeoutExpired:
+                print(f"Restore gave up after {budget:g} s: {' '.join(argv)}")
+                return False
+            except OSError:
+                return False
+        try:
+            proc = subprocess.Popen(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except OSError:
+            return False
+        return finish(argv, proc, time.perf_counter())
+
+    def finish(argv, proc, start):
+        timed_out = False
+        try:
+            proc.wait(timeout=max(0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+            timed_out = True
+            print(f"Restore gave up after {budget:g} s: {' '.join(argv)}")
+        if _supervisor.recorder:
+            _supervisor.recorder.record(
+                argv, None if timed_out else proc.returncode, "", None,
+                time.perf_counter() - start, timed_out=timed_out
+            )
+        return not timed_out and proc.returncode == 0
+
+    if _supervisor.replay:
+        results = [run_single(argv) for argv in commands]
+    else:
+        start = time.perf_counter()
+        procs = []
+        for argv in commands:
+            try:
+                procs.append(subprocess.Popen(
+                    argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                ))
+            except OSError:
+                return False
+        results = [finish(argv, proc, start) for argv, proc in zip(commands, procs)]
+
+    ok = True
+    for argv, done in zip(commands, results):
+        if not done and split_setvcp_args(argv) and time.monotonic() < deadline:
+            # Maybe a ddcutil that takes one feature per setvcp
+            done = all([run_single(single) for single in split_setvcp_args(argv)])
+        ok &= done
+    return ok
+
+
+def run_exit_restore():
+    """Restores every changed display once; safe to call from several exit paths."""
+    with _exit_restore_lock:
+        if not _restore_on_exit or not _exit_restore_plans:
+            return
+        commands = _exit_restore_commands()
+        _exit_restore_plans.clear()
+        with trace_span("exit_restore", cat="command"):
+            # Queued or in-flight applies must not land after the restore
+            _supervisor.shutdown(timeout=EXIT_SETTLE_TIMEOUT)
+            if run_restore_commands(commands, EXIT_RESTORE_BUDGET):
+                _remove_restore_journal()
+            else:
+                print(f"Monitor settings not fully restored; next launch retries ({RESTORE_JOURNAL}).")
+
+
+@traced
+def resume_interrupted_restore():
+    """Finishes a restore journaled by a previous run that died first."""
+    try:
+        with open(RESTORE_JOURNAL, "r") as f:
+            commands = json.load(f)["commands"]
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError, KeyError):
+        _remove_restore_journal()
+        return
+    if _supervisor.replay:
+        return  # Leave it for a run against the real monitors
+    print("Restoring monitor settings left over from the last session...")
+    if run_restore_commands(commands, RESUME_RESTORE_BUDGET):
+        _remove_restore_journal()
+    else:
+        print(f"Could not restore them; keeping {RESTORE_JOURNAL} to try again next launch.")
+
+
+def set_exit_signal_handling(root, enabled):
+    """
+    While enabled, SIGTERM/SIGINT/SIGHUP end Tk's main loop, so main()
+    restores the monitors and returns normally and atexit handlers
+    (--record, --profile) still run. Python handlers only run once the
+    interpreter gets control back, so the signal is also written to a
+    wakeup pipe Tk watches. Must be called from the main thread.
+    """
+    global _exit_signal_state
+    if enabled == (_exit_signal_state is not None):
+        return
+
+    if not enabled:
+        read_fd, write_fd, previous = _exit_signal_state
+        _exit_signal_state = None
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+        signal.set_wakeup_fd(-1)
+        root.deletefilehandler(read_fd)
+        os.close(read_fd)
+        os.close(write_fd)
+        return
+
+    def on_signal(signum, _frame):
+        global _exit_signal
+        _exit_signal = signum
+        root.quit()
+
+    read_fd, write_fd = os.pipe()
+    os.set_blocking(read_fd, False)
+    os.set_blocking(write_fd, False)
+    root.createfilehandler(read_fd, tk.READABLE, lambda fd, _mask: os.read(fd, 512))
+    signal.set_wakeup_fd(write_fd)
+    previous = {
+        signum: signal.signal(signum, on_signal)
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP)
+    }
+    _exit_signal_state = (read_fd, write_fd, previous)
+
+
+# ----------------------------
+# Drift watcher
+# ----------------------------
+# The monitor OSD (or another tool) can change gamma/saturation behind our
+# back. DriftWatcher reads 0x10/0x12/0x72/0x8A with one ddcutil call per
+# monitor, backing off exponentially while nothing changes and skipping
+# reads while an apply is in flight. Drift updates _applied_state (so
+# momentary reverts use the real values) and is queued for the UI.
+
+DRIFT_VCP_NAMES = {"0x10": "brightness", "0x12": "contrast", "0x72": "gamma", "0x8A": "saturation"}
+
+
+def parse_vcp_values(out):
+    """
+    Parses `ddcutil getvcp` output for several features into
+    {code: int}; gamma (0x72) is reported as its sh byte.
+    """
+    values = {}
+    for line in out.splitlines():
+        m = re.search(r"VCP code 0x([0-9A-Fa-f]{2})", line)
+        if not m:
+            continue
+        code = f"0x{m.group(1).upper()}"
+        if code == "0x72":
+            sh = re.search(r"sh=0x([0-9A-Fa-f]{2})", line)
+            if sh:
+                values[code] = int(sh.group(1), 16)
+        else:
+            cur = re.search(r"current value\s*=\s*(\d+)", line)
+            if cur:
+                values[code] = int(cur.group(1))
+    return values
+
+
+def _applied_vcp_value(code, value):
+    """Normalizes a written value (see ApplyPlan.values) for comparison."""
+    value = int(value, 0)
+    return value >> 8 if code == "0x72" else value
+
+
+class DriftWatcher:
+    def __init__(self, displays):
+        self.displays = [str(d) for d in displays]
+        self.events = queue.SimpleQueue()  # (display, {name: (old, new)})
+        self.interval = DRIFT_MIN_INTERVAL
+        self._last_seen = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="gg-drift", daemon=True)
+        self._stats = {"reads": 0, "read_seconds": 0.0, "skipped": 0, "drifts": 0}
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        """Bus usage so far: reads, total read time, skipped ticks, drifts."""
+        return dict(self._stats, interval=self.interval)
+
+    def _busy(self):
+        return (
+            _supervisor.stats()["running"] > 0
+            or time.monotonic() - _last_apply < DRIFT_SETTLE
+        )
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self._busy():
+                self._stats["skipped"] += 1
+                continue
+            changed = False
+            for display in self.displays:
+                if self._busy():
+                    break  # A game-critical apply started; yield the bus
+                changed |= self.check(display)
+            if changed:
+                self.interval = DRIFT_MIN_INTERVAL
+            else:
+                self.interval = min(DRIFT_MAX_INTERVAL, self.interval * 2)
+            trace_counter("drift_watch", **self.stats())
+
+    def check(self, display):
+        """Reads one monitor; returns True if anything moved since last time."""
+        argv = ddcutil_args(display, "getvcp", *DRIFT_VCP_NAMES)
+        start = time.perf_counter()
+        try:
+            out = _supervisor.check_output(argv, stderr=subprocess.STDOUT)
+        except Exception:
+            return False
+        finally:
+            self._stats["reads"] += 1
+            self._stats["read_seconds"] += time.perf_counter() - start
+        observed = parse_vcp_values(out)
+
+        applied = _applied_state.setdefault(display, {})
+        last_seen = self._last_seen.get(display, {})
+        drift = {}
+        for code, value in observed.items():
+            # What we expect: our own last write, else the last reading
+            if code in applied:
+                expected = _applied_vcp_value(code, applied[code])
+            else:
+                expected = last_seen.get(code)
+            if expected is not None and value != expected:
+                drift[DRIFT_VCP_NAMES[code]] = (expected, value)
+                applied[code] = f"0x{value:02X}00" if code == "0x72" else str(value)
+
+        moved = observed != last_seen
+        self._last_seen[display] = observed
+        if drift:
+            self._stats["drifts"] += 1
+            self.events.put((display, drift))
+        return moved or bool(drift)
+
+
+# ----------------------------
+# Adaptive presets
+# ----------------------------
+# Opt-in: sample a small frame of the screen about once a second, measure how
+# much of it is dark from a luminance histogram, and pick among the display's
+# saved presets (ranked by gamma: darker scene -> stronger preset). Frames
+# come from a pluggable provider (any callable returning an HxWx3 or HxW
+# uint8 array, or None), so SceneSelector can be driven by synthetic frames.
+# Needs numpy.
+
+# Screen capture commands writing a downscaled PPM to stdout, by preference
+FRAME_COMMANDS = (
+    ("grim", "-t", "ppm", "-s", "0.1", "-"),                                    # wlroots Wayland
+    ("import", "-silent", "-window", "root", "-resize", "160x90", "ppm:-"),     # X11 (ImageMagick)
+)
+
+
+def decode_ppm(data):
+    """Decodes an 8-bit binary PPM (P6) into an HxWx3 uint8 array, or None."""
+    m = re.match(rb"P6\s+(?:#[^\n]*\s+)*(\d+)\s+(?:#[^\n]*\s+)*(\d+)\s+(\d+)\s", data)
+    if not m or int(m.group(3)) > 255:
+        return None
+    width, height = int(m.group(1)), int(m.group(2))
+    if len(data) - m.end() < width * height * 3:
+        return None  # Truncated capture
+    pixels = np.frombuffer(data, np.uint8, width * height * 3, m.end())
+    return pixels.reshape(height, width, 3)
+
+
+def command_frame_provider():
+    """
+    Returns a frame provider using the first available FRAME_COMMANDS
+    entry, or None if there is no usable capture tool.
+    """
+    for argv in FRAME_COMMANDS:
+        if shutil.which(argv[0]):
+            def provider(argv=list(argv)):
+                try:
+                    result = _supervisor.run(argv, stderr=subprocess.DEVNULL, text=False)
+                except (OSError, subprocess.TimeoutExpired):
+                    return None
+                return decode_ppm(result.stdout) if result.returncode == 0 else None
+            return provider
+    return None
+
+
+class SceneSelector:
+    """
+    Picks a preset from frame luminance with hysteresis.
+
+    The dark fraction (pixels with luma below dark_level) in [0, 1] is split
+    into one equal band per preset. Leaving the current band requires the
+    score to clear that band's own edge by `hysteresis` for `dwell`
+    consecutive frames; the band of the last of those frames wins.
+    """
+    def __init__(self, dark_level=48, hysteresis=0.08, dwell=2):
+        self.dark_level = dark_level
+        self.hysteresis = hysteresis
+        self.dwell = dwell
+        self.stride = 1  # Extra subsampling, raised when over the CPU budget
+        self.ranked = []
+        self.current = None
+        self._pending_count = 0  # Consecutive frames that left the current band
+
+    def set_presets(self, presets):
+        """presets: {preset_id: preset}; resets state if the ranking changed."""
+        ranked = sorted(presets, key=lambda pid: (presets[pid].get("gamma", 0), pid))
+        if ranked != self.ranked:
+            self.ranked = ranked
+            self.current = None
+            self._pending_count = 0
+
+    def dark_fraction(self, frame):
+        f = frame[::self.stride, ::self.stride]
+        if f.ndim == 3:
+            # Rec. 709 luma in integer math: (54 R + 183 G + 19 B) / 256
+            f = f.astype(np.uint16)
+            f = (f[..., 0] * 54 + f[..., 1] * 183 + f[..., 2] * 19) >> 8
+        hist = np.bincount(f.ravel(), minlength=256)
+        total = hist.sum()
+        return hist[:self.dark_level].sum() / total if total else 0.0
+
+    def update(self, frame):
+        """Returns the preset id to switch to, or None to stay."""
+        if not self.ranked:
+            return None
+        n = len(self.ranked)
+        score = self.dark_fraction(frame)
+        band = min(n - 1, int(score * n))
+
+        if self.current is None:
+            self.current = band
+            return self.ranked[band]
+
+        # Measured from the current band's edge on the side being left, so
+        # a jump over several bands can't skip the margin
+        if band > self.current and score < (self.current + 1) / n + self.hysteresis:
+            band = self.current
+        elif band < self.current and score > self.current / n - self.hysteresis:
+            band = self.current
+
+        if band == self.current:
+            self._pending_count = 0
+            return None
+        self._pending_count += 1
+        if self._pending_count < self.dwell:
+            return None
+
+        self.current, self._pending_count = band, 0
+        return self.ranked[band]
+
+
+class AdaptivePresets:
+    def __init__(self, provider, get_display, all_presets,
+                 interval=ADAPTIVE_INTERVAL, cpu_budget=ADAPTIVE_CPU_BUDGET):
+        self.provider = provider
+        self.get_display = get_display
+        self.all_presets = all_presets
+        self.base_interval = self.interval = interval
+        self.cpu_budget = cpu_budget
+        self.selector = SceneSelector()
+        self.last_analysis = 0.0
+        self.last_cost = 0.0  # Capture + analysis of the last frame
+        self._last_error = None
+        self._own_apply = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="gg-adaptive", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            "analysis_ms": round(self.last_analysis * 1000, 3),
+            "cost_ms": round(self.last_cost * 1000, 3),
+            "interval": self.interval,
+            "stride": self.selector.stride,
+            "preset": self.selector.ranked[self.selector.current]
+                      if self.selector.current is not None else None,
+        }
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            # A hotkey or Apply press (or a held momentary preset) wins
+            if _staged_reverts:
+                continue
+            if _last_apply > self._own_apply and time.monotonic() - _last_apply < ADAPTIVE_MANUAL_HOLDOFF:
+                continue
+            try:
+                self.tick()
+            except Exception as e:
+                # One bad frame must not end adaptive mode; say so once
+                if str(e) != self._last_error:
+                    print(f"Adaptive presets: skipped a frame ({e})")
+                self._last_error = str(e)
+
+    def tick(self):
+        display = self.get_display()
+        start = time.perf_counter()
+        try:
+            frame = self.provider()
+            if frame is None:
+                return
+            analysis_start = time.perf_counter()
+            self.selector.set_presets(self.all_presets.get(str(display), {}))
+            preset_id = self.selector.update(frame)
+            self.last_analysis = time.perf_counter() - analysis_start
+        finally:
+            self.last_cost = time.perf_counter() - start
+            self._fit_budget()
+
+        if preset_id is not None:
+            with trace_span(f"adaptive preset {preset_id}", cat="hotkey"):
+                run_apply_plan(get_apply_plan(display, preset_id, self.all_presets))
+            self._own_apply = _last_apply
+
+    def _fit_budget(self):
+        # Subsample harder when analysis alone eats the budget...
+        budget = self.cpu_budget * self.base_interval
+        if self.last_analysis > budget and self.selector.stride < 16:
+            self.selector.stride *= 2
+        elif self.last_analysis < budget / 4 and self.selector.stride > 1:
+            self.selector.stride //= 2
+        # ...and sample less often when capture + analysis still don't fit.
+        # Wall time: the capture tool's work happens in another process.
+        self.interval = min(
+            ADAPTIVE_MAX_INTERVAL,
+            max(self.base_interval, self.last_cost / self.cpu_budget)
+        )
+
+
+# ----------------------------
+# Config hot-reload
+# ----------------------------
+# gg_presets.json may be edited by hand or synced from another machine while
+# we run. ConfigWatcher flags changes (inotify via libc, mtime polling if
+# that isn't available); the Tk loop then diffs the file against the
+# in-memory presets and only refreshes what changed. Idle mode stops
+# watching, so an idle gamergamma never wakes up for it.
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+_INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class ConfigWatcher:
+    """
+    poll() says whether gg_presets.json changed since the last call. With
+    inotify, `fd` becomes readable exactly when there is something to poll,
+    so the Tk loop watches it (createfilehandler) rather than waking on a
+    timer; without inotify, `fd` is None and poll() compares mtimes.
+    """
+    def __init__(self, path=CONFIG_FILE):
+        self.path = os.path.abspath(path)
+        self.fd = self._open_inotify()
+        self._mtime = self._stat()
+
+    def _open_inotify(self):
+        # Watch the directory: editors and sync tools usually replace the
+        # file by rename, which would drop a watch on the file itself.
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                return None
+            mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+            if libc.inotify_add_watch(fd, os.path.dirname(self.path).encode(), mask) < 0:
+                os.close(fd)
+                return None
+            return fd
+        except (OSError, AttributeError):
+            return None
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def poll(self):
+        if self.fd is None:
+            mtime = self._stat()
+            changed = mtime is not None and mtime != self._mtime
+            self._mtime = mtime
+            return changed
+
+        name = os.path.basename(self.path).encode()
+        changed = False
+        while True:
+            try:
+                buf = os.read(self.fd, 4096)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(buf):
+                _, _, _, length = _INOTIFY_EVENT.unpack_from(buf, offset)
+                offset += _INOTIFY_EVENT.size
+                if buf[offset:offset + length].rstrip(b"\0") == name:
+                    changed = True
+                offset += length
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def read_config_file():
+    """Returns the parsed config, or None if it's missing or mid-write."""
+    try:
+        with open(CONFIG_FILE, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("presets", {}), dict):
+        return None
+    return data
+
+
+def preset_problem(preset):
+    """Returns why a preset read from gg_presets.json is unusable, or None."""
+    if not isinstance(preset, dict):
+        return "not an object"
+    for key, low, high in (("gamma", 0, 255), ("vibrance", -1023, 1023)):
+        value = preset.get(key)
+        if not isinstance(value, int) or isinstance(value, bool) or not low <= value <= high:
+            return f"{key} must be an integer from {low} to {high}"
+    if preset.get("vibrance_mode") not in ("nvidia", "ddc"):
+        return 'vibrance_mode must be "nvidia" or "ddc"'
+    if not isinstance(preset.get("hotkey"), str):
+        return "hotkey must be a string"
+    if preset.get("hotkey_mode") not in ("press", "hold"):
+        return 'hotkey_mode must be "press" or "hold"'
+    return None
+
+
+def valid_external_presets(presets):
+    """
+    Returns the usable part of a config's "presets", defaults filled in.
+    Anything unusable is skipped with a message, so a bad hand edit never
+    reaches the in-memory model (and from there a later save).
+    """
+    valid = {}
+    for display, monitor_presets in presets.items():
+        if not isinstance(monitor_presets, dict):
+            print(f"{CONFIG_FILE}: ignoring presets for display {display}: not an object")
+            continue
+        for pid, preset in monitor_presets.items():
+            if isinstance(preset, dict):
+                preset = dict(DEFAULT_PRESETS.get(pid, {}), **preset)
+            problem = preset_problem(preset)
+            if problem:
+                print(f"{CONFIG_FILE}: ignoring display {display} preset {pid}: {problem}")
+                continue
+            valid.setdefault(display, {})[pid] = preset
+    return valid
+
+
+def diff_presets(old, new):
+    """
+    Returns the set of (display, preset_id) in `new` whose settings differ
+    from `old`. Presets missing from `new` are left alone rather than
+    treated as deleted, since in-memory backfills may never have been saved.
+    """
+    changed = set()
+    for display, new_monitor in new.items():
+        old_monitor = old.get(display, {})
+        for pid, preset in new_monitor.items():
+            if old_monitor.get(pid) != preset:
+                changed.add((display, pid))
+    return changed
+
+
+@traced
+def merge_external_presets(all_presets, data):
+    """
+    Applies externally edited presets onto the in-memory model in place
+    (so PresetPanes and later save()s see them) and recompiles only the
+    affected apply plans.
+
+    Returns:
+        set of changed (display, preset_id)
+    """
+    new_presets = valid_external_presets(data.get("presets", {}))
+    changed = diff_presets(all_presets, new_presets)
+    for display, pid in changed:
+        preset = new_presets[display][pid]
+        all_presets.setdefault(display, {})[pid] = preset
+        store_apply_plan(display, pid, preset)
+
+    load_monitor_entries(data)
+    return changed
 
 # ----------------------------
 # GUI
@@ -357,7 +1935,7 @@ class PresetPane(ttk.Frame):
 
         self.title_label = ttk.Label(
             self,
-            text=f"{self.base_title} ({current_preset['hotkey'].upper()})",
+            text=self._title_text(current_preset),
             font=("Sans", 12, "bold"),
             cursor="hand2",
             foreground="black"
@@ -458,12 +2036,25 @@ class PresetPane(ttk.Frame):
         self.update_ddc_slider_limits()
         self._update_vibrance_ui()
 
+    def destroy(self):
+        # Cancel animation timers so nothing fires into a destroyed widget
+        for attr in ("_hover_after_id", "_throb_after_id"):
+            if hasattr(self, attr):
+                self.after_cancel(getattr(self, attr))
+        super().destroy()
+
     # ---- Helper to get current monitor's preset ----
     def _get_current_preset(self):
         """Get the preset for the currently selected monitor"""
         display = str(self.get_display())
         return self.all_presets.get(display, {}).get(self.preset_id, DEFAULT_PRESETS[self.preset_id].copy())
 
+    def _title_text(self, preset):
+        hotkey = preset["hotkey"].upper()
+        if preset.get("hotkey_mode") == "hold":
+            hotkey += ", HOLD"
+        return f"{self.base_title} ({hotkey})"
+
     def reload_from_monitor(self):
         """Reload UI from the currently selected monitor's presets"""
         current_preset = self._get_current_preset()
@@ -480,7 +2071,7 @@ class PresetPane(ttk.Frame):
 
         # Update title with hotkey
         self.title_label.configure(
-            text=f"{self.base_title} ({current_preset['hotkey'].upper()})"
+            text=self._title_text(current_preset)
         )
 
         # Refresh vibrance UI
@@ -558,9 +2149,8 @@ class PresetPane(ttk.Frame):
 
     def refresh_title(self):
         current_preset = self._get_current_preset()
-        hotkey = current_preset["hotkey"]
         self.title_label.configure(
-            text=f"{self.base_title} ({hotkey.upper()})"
+            text=self._title_text(current_preset)
     )
     def throb_title(self, duration_ms=100):
         """
@@ -622,6 +2212,9 @@ class PresetPane(ttk.Frame):
         data["presets"] = self.all_presets
         save_presets(data)
 
+        # Recompile so the hotkey dispatches the newly saved values
+        store_apply_plan(display, self.preset_id, p)
+
 
     def apply(self):
         apply_preset(
@@ -635,9 +2228,11 @@ class PresetPane(ttk.Frame):
     # ---- Hotkey config ----
 
     def open_hotkey_config(self, _=None):
-        win = tk.Toplevel(self)
+        # Parented to the main window rather than this pane, so idle mode
+        # (which destroys the panes) leaves an open dialog alone
+        win = tk.Toplevel(self.winfo_toplevel())
         win.title(f"Configure Hotkey – Preset {self.preset_id}")
-        win.transient(self)
+        win.transient(self.winfo_toplevel())
 
         win.resizable(False, False)
 
@@ -657,6 +2252,12 @@ class PresetPane(ttk.Frame):
         entry.grid(row=1, column=1, padx=10, pady=5)
         entry.focus_set()
 
+        # Momentary: apply while held, revert to the previous state on release
+        hold_var = tk.BooleanVar(value=current_preset.get("hotkey_mode") == "hold")
+        ttk.Checkbutton(
+            win, text="Hold to peek (revert on release)", variable=hold_var
+        ).grid(row=2, column=0, columnspan=2, padx=10, pady=5, sticky="w")
+
         pressed = set()
         win.wait_visibility()
         win.grab_set()
@@ -681,6 +2282,8 @@ class PresetPane(ttk.Frame):
             on_release=on_release
         )
         listener.start()
+        # However the dialog goes away, its capture hook must go with it
+        win.bind("<Destroy>", lambda e: listener.stop() if e.widget is win else None)
 
 
         def clear():
@@ -688,7 +2291,10 @@ class PresetPane(ttk.Frame):
             hotkey_var.set("")
 
         def save_hotkey():
+            mode = "hold" if hold_var.get() else "press"
             new = hotkey_var.get().strip()
+            if not new and mode != current_preset.get("hotkey_mode", "press"):
+                new = current_preset["hotkey"]  # Only the hotkey type changed
             if not new:
                 messagebox.showerror("Error", "Hotkey cannot be empty.")
                 return
@@ -702,55 +2308,212 @@ class PresetPane(ttk.Frame):
                 self.all_presets[display][self.preset_id] = DEFAULT_PRESETS[self.preset_id].copy()
 
             self.all_presets[display][self.preset_id]["hotkey"] = new
+            self.all_presets[display][self.preset_id]["hotkey_mode"] = mode
 
             # Load the full data structure, update presets, and save
             data = load_presets()
             data["presets"] = self.all_presets
             save_presets(data)
 
-            self.refresh_title()
-            listener.stop()
-            setup_hotkeys(self.master)
+            if self.winfo_exists():
+                self.refresh_title()  # Else idle mode rebuilds the pane later
+            setup_hotkeys(self.all_presets, self.get_display())
             win.destroy()
 
-        ttk.Button(win, text="Clear", command=clear).grid(row=2, column=0, padx=10, pady=10)
-        ttk.Button(win, text="Save Hotkey", command=save_hotkey).grid(row=2, column=1, padx=10, pady=10)
+        ttk.Button(win, text="Clear", command=clear).grid(row=3, column=0, padx=10, pady=10)
+        ttk.Button(win, text="Save Hotkey", command=save_hotkey).grid(row=3, column=1, padx=10, pady=10)
 
-        win.protocol("WM_DELETE_WINDOW", lambda: (listener.stop(), win.destroy()))
+        win.protocol("WM_DELETE_WINDOW", win.destroy)
 
 # ----------------------------
 # Hotkeys + Menu
 # ----------------------------
-def setup_hotkeys(container):
-    global _hotkey_listener, _hotkey_map
+def _on_hotkey_press(key):
+    key = _hotkey_listener.canonical(key)
+    for _, hotkey in list(_hotkey_map.values()):
+        hotkey.press(key)
 
-    _hotkey_map = {}
 
-    for child in container.winfo_children():
-        if isinstance(child, PresetPane):
-            current_preset = child._get_current_preset()
-            hk = current_preset["hotkey"]
+def _on_hotkey_release(key):
+    key = _hotkey_listener.canonical(key)
+    for _, hotkey in list(_hotkey_map.values()):
+        hotkey.release(key)
 
-            # pynput needs all hotkey strings which aren't single characters to be <wrapped>'
-            # Look at this ugly piece of work right here.
-            pynput_hk = "+".join(
-                f"<{k}>" if len(k) >= 2 else k
-                for k in hk.lower().split("+")
-            )
 
-            #_hotkey_map[pynput_hk] = child.apply
-            def make_callback(pane):
-                def cb():
-                    # Throb title immediately on hotkey
-                    pane.throb_title(250)
-                    pane.apply()
-                return cb
+class MomentaryHotKey:
+    """
+    Hold-to-peek counterpart of pynput's HotKey: on_press fires once the
+    whole combination is down, on_release as soon as any of its keys lifts.
+    """
+    def __init__(self, keys, on_press, on_release):
+        self._keys = set(keys)
+        self._state = set()
+        self._active = False
+        self._on_press = on_press
+        self._on_release = on_release
+
+    def press(self, key):
+        if key in self._keys and key not in self._state:
+            self._state.add(key)
+            if self._state == self._keys and not self._active:
+                self._active = True
+                self._on_press()
+
+    def release(self, key):
+        if key in self._state:
+            self._state.remove(key)
+            if self._active:
+                self._active = False
+                self._on_release()
+
+
+def _hotkey_dispatch_loop():
+    """
+    Drains hotkey events and hands their apply plans to the supervisor.
+    Runs on its own thread so neither the key hook nor hardware application
+    ever waits on Tk; UI feedback is queued for drain_hotkey_feedback().
+
+    Events are (display, action, preset_id, all_presets) where action is
+    "apply", "hold" (momentary key down) or "release" (momentary key up).
+    """
+    while True:
+        events = [_hotkey_events.get()]
+        try:
+            while True:
+                events.append(_hotkey_events.get_nowait())
+        except queue.Empty:
+            pass
+
+        # Walk the burst in order, but only send each display's final target,
+        # so rapid press/release sequences collapse to the right end state.
+        # Targets from separate bursts stay ordered too: the supervisor runs
+        # each bus's commands in submission order.
+        # A bad preset (or any other error) drops only its own event: this
+        # thread dying would silently disable every hotkey.
+        targets = {}
+        for display, action, preset_id, all_presets in events:
+            try:
+                pending = targets.get(display, (None, None))[0]
+                if action == "release":
+                    revert = _staged_reverts.pop(display, None)
+                    if revert is not None:
+                        targets[display] = (revert, None)
+                    continue
+
+                plan = get_apply_plan(display, preset_id, all_presets)
+                if action == "hold" and display not in _staged_reverts:
+                    # Pre-stage the revert now so key-up only has to send it
+                    _staged_reverts[display] = stage_revert_plan(plan, pending)
+                targets[display] = (plan, preset_id)
+            except Exception as e:
+                print(f"Hotkey for display {display} preset {preset_id} failed: {e!r}")
+
+        for display, (plan, preset_id) in targets.items():
+            try:
+                with trace_span(f"hotkey display {display}", cat="hotkey"):
+                    run_apply_plan(plan)
+            except Exception as e:
+                print(f"Hotkey for display {display} preset {preset_id} failed: {e!r}")
+                continue
+            if preset_id is not None and _show_hotkey_feedback:
+                _hotkey_feedback.put(preset_id)
+
+
+def drain_hotkey_feedback(panes):
+    """Plays queued hotkey feedback on the Tk thread ({preset_id: PresetPane})."""
+    try:
+        while True:
+            pane = panes.get(_hotkey_feedback.get_nowait())
+            if pane is not None and pane.winfo_exists():
+                pane.throb_title(250)
+    except queue.Empty:
+        pass
+
+
+def register_hotkeys(bindings):
+    """
+    Brings the global hotkey table in line with `bindings`
+    ({pynput combo: (spec, on_press, on_release)}). on_release is None for
+    plain hotkeys, otherwise a MomentaryHotKey is used. Only combos that are
+    new or whose spec changed get a fresh hotkey; the keyboard listener
+    itself is started once and kept running.
+    """
+    global _hotkey_listener, _hotkey_dispatcher
+
+    for combo in list(_hotkey_map):
+        if combo not in bindings:
+            del _hotkey_map[combo]
+
+    for combo, (spec, on_press, on_release) in bindings.items():
+        current = _hotkey_map.get(combo)
+        if current is None or current[0] != spec:
+            keys = pynput_keyboard.HotKey.parse(combo)
+            if on_release is None:
+                hotkey = pynput_keyboard.HotKey(keys, on_press)
+            else:
+                hotkey = MomentaryHotKey(keys, on_press, on_release)
+            _hotkey_map[combo] = (spec, hotkey)
+
+    if _hotkey_dispatcher is None:
+        _hotkey_dispatcher = threading.Thread(
+            target=_hotkey_dispatch_loop, name="gg-hotkey-dispatch", daemon=True
+        )
+        _hotkey_dispatcher.start()
+
+    if _hotkey_listener is None:
+        _hotkey_listener = pynput_keyboard.Listener(
+            on_press=_on_hotkey_press,
+            on_release=_on_hotkey_release
+        )
+        _hotkey_listener.start()
+
 
-            _hotkey_map[pynput_hk] = make_callback(child)
-    if _hotkey_listener:
-        _hotkey_listener.stop()
-    _hotkey_listener = pynput_keyboard.GlobalHotKeys(_hotkey_map)
-    _hotkey_listener.start()
+@traced
+def setup_hotkeys(all_presets, display):
+    """
+    Registers the hotkeys of `display`'s presets. Works purely from the
+    preset model, so it keeps working while the window is torn down.
+    """
+    bindings = {}
+    display_presets = all_presets.get(str(display), {})
+
+    for preset_id, defaults in DEFAULT_PRESETS.items():
+        current_preset = display_presets.get(preset_id, defaults)
+        hk = current_preset["hotkey"]
+
+        # pynput needs all hotkey strings which aren't single characters to be <wrapped>'
+        # Look at this ugly piece of work right here.
+        pynput_hk = "+".join(
+            f"<{k}>" if len(k) >= 2 else k
+            for k in hk.lower().split("+")
+        )
+
+        # Hotkeys dispatch the saved preset's prebuilt plan; compile it
+        # now so the first press doesn't pay for it.
+        get_apply_plan(display, preset_id, all_presets)
+
+        def make_callback(preset_id, action):
+            def cb():
+                # Runs on pynput's hook thread: only enqueue, never touch Tk
+                trace_instant(f"hotkey {action} {preset_id}", cat="hotkey")
+                _hotkey_events.put((display, action, preset_id, all_presets))
+            return cb
+
+        mode = current_preset.get("hotkey_mode", "press")
+        if mode == "hold":
+            bindings[pynput_hk] = (
+                (display, preset_id, mode),
+                make_callback(preset_id, "hold"),
+                make_callback(preset_id, "release")
+            )
+        else:
+            bindings[pynput_hk] = (
+                (display, preset_id, mode),
+                make_callback(preset_id, "apply"),
+                None
+            )
+
+    register_hotkeys(bindings)
 
 def show_about():
     def open_url(url):
@@ -827,17 +2590,23 @@ def show_about():
     ttk.Button(frame, text="OK", command=win.destroy).pack(pady=(10, 0))
 
 
-def add_dependency_status_bar(root):
+@traced
+def init_dependencies():
     """
-    Adds a subtle status bar to the bottom-right of the main window.
-    Shows warnings if dependencies are missing.
+    Checks the external tools once at startup. Prints what's missing and
+    returns the status bar messages for it.
     """
     # Persist the result here, lazily as global because only want to make calls
     # to the dependencies which exist, without failing hard.
-    global _deps
+    global _deps, _ddc_multi_setvcp
     _deps = check_linux_dependencies()
+    ddcutil_version = _deps.get("ddcutil", {}).get("version")
+    _ddc_multi_setvcp = ddcutil_supports_multi_setvcp(ddcutil_version)
+    invalidate_apply_plans()  # Plans depend on which tools are installed
 
     status_parts = []
+    if not _ddc_multi_setvcp:
+        print(f"{ddcutil_version.splitlines()[0]}: writing VCP features one setvcp at a time.")
     if not _deps.get("ddcutil", {}).get("installed", False):
         msg = "Gamma disabled: ddcutil not found."
         print(msg)
@@ -846,7 +2615,14 @@ def add_dependency_status_bar(root):
         msg = "Vibrance disabled: nvibrant not found."
         print(msg)
         status_parts.append(msg)
+    return status_parts
 
+
+def add_dependency_status_bar(root, status_parts):
+    """
+    Adds a subtle status bar to the bottom-right of the main window.
+    Shows warnings if dependencies are missing (see init_dependencies()).
+    """
     status_text = " | ".join(status_parts) if status_parts else ""
 
     # Status bar frame
@@ -869,91 +2645,419 @@ def add_dependency_status_bar(root):
 # Main App
 # ----------------------------
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="gamergamma")
+    parser.add_argument(
+        "--calibrate", metavar="DISPLAY", type=int,
+        help="find the fastest reliable DDC timing for DISPLAY, save it and exit"
+    )
+    parser.add_argument(
+        "--profile", metavar="TRACE", nargs="?", const="gamergamma-trace.json",
+        help="record startup/command/hotkey spans to a Chrome trace (Perfetto) JSON file "
+             "(default: gamergamma-trace.json)"
+    )
+    parser.add_argument(
+        "--profile-python", action="store_true",
+        help="with --profile, also capture a cProfile of the main thread to TRACE.prof"
+    )
+    sessions = parser.add_mutually_exclusive_group()
+    sessions.add_argument(
+        "--record", metavar="TRACE",
+        help="record every ddcutil/nvibrant call (output + timing) to TRACE (.jsonl or .jsonl.gz)"
+    )
+    sessions.add_argument(
+        "--replay", metavar="TRACE",
+        help="answer ddcutil/nvibrant calls from a recorded TRACE instead of the hardware"
+    )
+    return parser.parse_args(argv)
+
+
+def run_calibration(display):
+    print(f"Calibrating DDC timing for display {display}...")
+    multiplier = calibrate_ddc_timing(display)
+    save_ddc_timing(display, multiplier)
+    if multiplier is None:
+        print("Monitor did not respond reliably; DDC timing left unchanged.")
+        return 1
+    print(f"Saved sleep multiplier {multiplier:g} for display {display}.")
+    return 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.profile:
+        start_profiling(args.profile, cprofile=args.profile_python)
+    if args.record:
+        _supervisor.recorder = CommandRecorder(args.record)
+        atexit.register(_supervisor.recorder.close)
+    elif args.replay:
+        _supervisor.replay = CommandReplay(args.replay)
     print(f"gamergamma v{VERSION}\n  created by: github.com/Animosity")
+    if args.calibrate is not None:
+        return run_calibration(args.calibrate)
+
     data = load_presets()
     all_presets = data["presets"]  # This is now per-monitor: {display: {preset_id: {...}}}
     monitors = detect_monitors()
+    dependency_status = init_dependencies()
+    resume_interrupted_restore()
+    set_restore_on_exit(data.get("settings", {}).get("restore_on_exit", False))
 
-    root = tk.Tk()
+    with trace_span("tk_init"):
+        root = tk.Tk()
     root.title(f"gamergamma v{VERSION}")
+    set_exit_signal_handling(root, _restore_on_exit)
+
+    # ---- State that outlives the window (kept in idle mode) ----
+    settings = data.get("settings", {})
+    selected_display = [monitors[0][0] if monitors else 1]
+    ui = {}      # Widgets of the current main window; empty while idle
+    timers = {}  # name -> after() id of every periodic callback
+    drift_watcher = [None]
+    drift_watch_var = tk.BooleanVar(root, value=settings.get("drift_watch", False))
+    idle_on_minimize_var = tk.BooleanVar(root, value=settings.get("idle_on_minimize", False))
+    restore_on_exit_var = tk.BooleanVar(root, value=settings.get("restore_on_exit", False))
+    adaptive_var = tk.BooleanVar(root, value=settings.get("adaptive", False))
+    adaptive = [None]
+    config_watcher = ConfigWatcher()
+    known_monitor_state = [data.get("monitors", {})]
+
+    def get_selected_display():
+        return selected_display[0]
 
+    def every(name, ms, func):
+        def tick():
+            func()
+            timers[name] = root.after(ms, tick)
+        timers[name] = root.after(ms, tick)
+
+    def cancel_timer(name):
+        after_id = timers.pop(name, None)
+        if after_id is not None:
+            root.after_cancel(after_id)
+
+    # ---- Menu (survives idle mode) ----
     menubar = tk.Menu(root)
+    options_menu = tk.Menu(menubar, tearoff=0)
     help_menu = tk.Menu(menubar, tearoff=0)
     help_menu.add_command(label="About", command=show_about)
+    menubar.add_cascade(label="Options", menu=options_menu)
     menubar.add_cascade(label="Help", menu=help_menu)
     root.config(menu=menubar)
 
-    top = ttk.Frame(root, padding=10)
-    top.pack(fill="x")
+    # ---- Main window ----
+    def build_window():
+        global _show_hotkey_feedback
 
-    ttk.Label(top, text="Monitor:").pack(side="left")
+        top = ttk.Frame(root, padding=10)
+        top.pack(fill="x")
 
-    monitor_var = tk.StringVar()
-    monitor_map = {}
-    display_values = []
+        ttk.Label(top, text="Monitor:").pack(side="left")
 
-    for idx, name in monitors:
-        label = f"{idx} – {name}"
-        monitor_map[label] = idx
-        display_values.append(label)
+        monitor_var = tk.StringVar(root)
+        monitor_map = {}
+        display_values = []
 
-    # Set default monitor (first one detected)
-    if display_values:
-        monitor_var.set(display_values[0])
+        for idx, name in monitors:
+            label = f"{idx} – {name}"
+            monitor_map[label] = idx
+            display_values.append(label)
+            if idx == selected_display[0]:
+                monitor_var.set(label)
 
-    combo = ttk.Combobox(
-        top,
-        textvariable=monitor_var,
-        values=display_values,
-        state="readonly",
-        width=40
-    )
+        combo = ttk.Combobox(
+            top,
+            textvariable=monitor_var,
+            values=display_values,
+            state="readonly",
+            width=40
+        )
+
+        def on_monitor_change(_):
+            selected_display[0] = monitor_map.get(monitor_var.get(), selected_display[0])
+            for pane in ui["panes"].values():
+                pane.reload_from_monitor()  # Load settings for newly selected monitor
+                pane.update_ddc_slider_limits()
+            # Re-register hotkeys for the newly selected monitor
+            setup_hotkeys(all_presets, get_selected_display())
+
+        combo.bind("<<ComboboxSelected>>", on_monitor_change)
+        combo.pack(side="left", padx=(10, 5))
+
+        def restore_selected_monitor():
+            display = get_selected_display()
+            restore_monitor_state(display)
+
+        restore_btn = ttk.Button(
+            top,
+            text="Restore Monitor Settings",
+            command=restore_selected_monitor
+        )
 
-    def on_monitor_change(_):
-        for child in container.winfo_children():
-            if isinstance(child, PresetPane):
-                child.reload_from_monitor()  # Load settings for newly selected monitor
-                child.update_ddc_slider_limits()
-        setup_hotkeys(container)  # Re-register hotkeys for the newly selected monitor
+        restore_btn.pack(side="left", padx=(5, 0))
+
+        def calibrate_selected_monitor():
+            # Calibration issues dozens of DDC round trips; keep it off the Tk
+            # thread and poll for the result.
+            display = get_selected_display()
+            result = {}
+            calibrate_btn.configure(state="disabled", text="Calibrating...")
+
+            def worker():
+                result["multiplier"] = calibrate_ddc_timing(display)
+
+            def poll():
+                # Deliberately not in timers: going idle mid-calibration must
+                # not drop the result, only the button it would update.
+                if thread.is_alive():
+                    root.after(200, poll)
+                    return
+                multiplier = result.get("multiplier")
+                save_ddc_timing(display, multiplier)
+                if calibrate_btn.winfo_exists():
+                    calibrate_btn.configure(state="normal", text="Calibrate DDC Timing")
+                if multiplier is None:
+                    messagebox.showerror(
+                        "Calibration failed",
+                        f"Display {display} did not respond reliably; DDC timing left unchanged."
+                    )
+                else:
+                    messagebox.showinfo(
+                        "Calibration complete",
+                        f"Display {display}: ddcutil sleep multiplier {multiplier:g}"
+                    )
+
+            thread = threading.Thread(target=worker, daemon=True)
+            thread.start()
+            poll()
+
+        calibrate_btn = ttk.Button(
+            top,
+            text="Calibrate DDC Timing",
+            command=calibrate_selected_monitor
+        )
+
+        calibrate_btn.pack(side="left", padx=(5, 0))
 
-    combo.bind("<<ComboboxSelected>>", on_monitor_change)
-    combo.pack(side="left", padx=(10, 5))
+        container = ttk.Frame(root, padding=10)
+        container.pack(fill="both", expand=True)
 
-    def restore_selected_monitor():
-        display = get_selected_display()
-        restore_monitor_state(display)
+        panes = {}
+        with trace_span("build_preset_panes"):
+            for i in ("1", "2", "3"):
+                panes[i] = PresetPane(
+                    container,
+                    i,
+                    f"Preset {i}",
+                    all_presets,
+                    get_selected_display
+                )
+                panes[i].pack(side="left", expand=True, fill="both", padx=5)
+
+        status_label = add_dependency_status_bar(root, dependency_status)
+        # Drift watch bus usage, left of the dependency status
+        drift_label = ttk.Label(status_label.master, font=("Sans", 9), foreground="#666666")
+        drift_label.pack(side="left", anchor="w")
+        ui.update(
+            top=top, container=container, panes=panes, status_label=status_label,
+            drift_label=drift_label,
+            base_status=(status_label.cget("text"), status_label.cget("foreground"))
+        )
 
-    restore_btn = ttk.Button(
-        top,
-        text="Restore Monitor Settings",
-        command=restore_selected_monitor
+        _show_hotkey_feedback = True
+        every("hotkey_feedback", HOTKEY_FEEDBACK_POLL_MS, lambda: drain_hotkey_feedback(panes))
+        watch_config()
+        apply_drift_watch()
+
+    # ---- Idle mode ----
+    # Tears the whole widget tree down and cancels every after() timer;
+    # only the hotkey listener/dispatcher and the supervisor keep running.
+    # Restoring the window (taskbar, or the Show button) rebuilds it from
+    # the in-memory presets.
+    def enter_idle():
+        global _show_hotkey_feedback
+        if "idle" in ui:
+            return
+        _show_hotkey_feedback = False
+        for name in list(timers):
+            cancel_timer(name)
+        unwatch_config()
+        stop_drift_watch()
+        for child in root.winfo_children():
+            # Leave the menu and any open dialog (e.g. hotkey capture) alone
+            if child is not menubar and not isinstance(child, tk.Toplevel):
+                child.destroy()
+        ui.clear()
+
+        idle_frame = ttk.Frame(root, padding=10)
+        idle_frame.pack(fill="both", expand=True)
+        ttk.Label(idle_frame, text="Idle – hotkeys are active.").pack(side="left")
+        ttk.Button(idle_frame, text="Show gamergamma", command=leave_idle).pack(side="left", padx=(10, 0))
+        ui["idle"] = idle_frame
+        root.iconify()
+
+    def leave_idle():
+        if "idle" not in ui:
+            return
+        ui.pop("idle").destroy()
+        build_window()
+        reload_config()  # Pick up edits made while idle
+        root.deiconify()
+
+    def on_map(event):
+        if event.widget is root:
+            leave_idle()
+
+    def on_unmap(event):
+        if event.widget is root and idle_on_minimize_var.get() and root.state() == "iconic":
+            enter_idle()
+
+    root.bind("<Map>", on_map)
+    root.bind("<Unmap>", on_unmap)
+
+    # ---- Config hot-reload ----
+    def watch_config():
+        if config_watcher.fd is not None:
+            root.createfilehandler(
+                config_watcher.fd, tk.READABLE, lambda _fd, _mask: poll_config_changes()
+            )
+        else:
+            every("config", 1000, poll_config_changes)
+
+    def unwatch_config():
+        # Inotify events queue up in the kernel meanwhile; nothing wakes us
+        if config_watcher.fd is not None:
+            root.deletefilehandler(config_watcher.fd)
+        cancel_timer("config")
+
+    def poll_config_changes():
+        if config_watcher.poll():
+            reload_config()
+
+    def reload_config():
+        new_data = read_config_file()
+        if new_data is not None:
+            on_config_changed(new_data)
+
+    def on_config_changed(new_data):
+        changed = merge_external_presets(all_presets, new_data)
+        monitors_changed = new_data.get("monitors", {}) != known_monitor_state[0]
+        known_monitor_state[0] = new_data.get("monitors", {})
+        if not changed and not monitors_changed:
+            return  # Our own save, or nothing we care about
+
+        display = str(get_selected_display())
+        for pane in ui.get("panes", {}).values():
+            if (display, pane.preset_id) in changed:
+                pane.reload_from_monitor()
+            if monitors_changed:
+                pane.update_ddc_slider_limits()
+        if any(d == display for d, _ in changed):
+            # Only re-registers combos that changed
+            setup_hotkeys(all_presets, get_selected_display())
+
+    # ---- Drift watcher (optional) ----
+    def drain_drift():
+        watcher = drift_watcher[0]
+        try:
+            while True:
+                display, drift = watcher.events.get_nowait()
+                changes = ", ".join(f"{k} {old}→{new}" for k, (old, new) in drift.items())
+                ui["status_label"].configure(
+                    text=f"Display {display} changed outside gamergamma: {changes}",
+                    foreground="#AA6600"
+                )
+        except queue.Empty:
+            pass
+        stats = watcher.stats()
+        ui["drift_label"].configure(
+            text=f"Drift watch: {stats['reads']} reads, "
+                 f"{stats['read_seconds']:.1f} s on the bus, next in {stats['interval']:g} s"
+        )
+
+    def stop_drift_watch():
+        cancel_timer("drift")
+        if drift_watcher[0]:
+            drift_watcher[0].stop()
+            drift_watcher[0] = None
+
+    def apply_drift_watch():
+        stop_drift_watch()
+        if "status_label" in ui:
+            text, foreground = ui["base_status"]
+            ui["status_label"].configure(text=text, foreground=foreground)
+            ui["drift_label"].configure(text="")
+        if drift_watch_var.get():
+            drift_watcher[0] = DriftWatcher([idx for idx, _ in monitors]).start()
+            every("drift", 1000, drain_drift)
+
+    def toggle_drift_watch():
+        save_setting("drift_watch", drift_watch_var.get())
+        apply_drift_watch()
+
+    options_menu.add_checkbutton(
+        label="Watch for monitor drift (OSD changes)",
+        variable=drift_watch_var,
+        command=toggle_drift_watch
+    )
+    options_menu.add_checkbutton(
+        label="Go idle when minimized",
+        variable=idle_on_minimize_var,
+        command=lambda: save_setting("idle_on_minimize", idle_on_minimize_var.get())
     )
+    options_menu.add_command(label="Go idle now (hotkeys only)", command=enter_idle)
 
-    restore_btn.pack(side="left", padx=(5, 0))
+    def toggle_restore_on_exit():
+        save_setting("restore_on_exit", restore_on_exit_var.get())
+        set_restore_on_exit(restore_on_exit_var.get())
+        set_exit_signal_handling(root, restore_on_exit_var.get())
 
+    options_menu.add_checkbutton(
+        label="Restore monitor settings on exit",
+        variable=restore_on_exit_var,
+        command=toggle_restore_on_exit
+    )
 
-    def get_selected_display():
-        selected_label = monitor_var.get()
-        return monitor_map.get(selected_label, monitors[0][0] if monitors else 1)
+    # ---- Adaptive presets (optional) ----
+    def apply_adaptive():
+        if adaptive[0]:
+            adaptive[0].stop()
+            adaptive[0] = None
+        if not adaptive_var.get():
+            return
+        provider = command_frame_provider() if np is not None else None
+        if provider is None:
+            adaptive_var.set(False)
+            messagebox.showerror(
+                "Adaptive presets unavailable",
+                "Adaptive presets need numpy and a screen capture tool "
+                "(grim on wlroots Wayland, or ImageMagick's import on X11)."
+            )
+            return
+        adaptive[0] = AdaptivePresets(provider, get_selected_display, all_presets).start()
 
-    container = ttk.Frame(root, padding=10)
-    container.pack(fill="both", expand=True)
+    def toggle_adaptive():
+        apply_adaptive()
+        save_setting("adaptive", adaptive_var.get())
 
-    for i in ("1", "2", "3"):
-        PresetPane(
-            container,
-            i,
-            f"Preset {i}",
-            all_presets,
-            get_selected_display
-        ).pack(side="left", expand=True, fill="both", padx=5)
+    options_menu.add_checkbutton(
+        label="Adaptive presets (pick by scene brightness)",
+        variable=adaptive_var,
+        command=toggle_adaptive
+    )
 
+    build_window()
+    setup_hotkeys(all_presets, get_selected_display())
+    apply_adaptive()
 
-    status_label = add_dependency_status_bar(root)
-    setup_hotkeys(container)
-    root.mainloop()
+    root.after_idle(trace_instant, "first_idle")  # Window is up and idle
+    if _exit_signal is None:  # mainloop() would forget a quit() from startup
+        root.mainloop()
+    config_watcher.close()
+    run_exit_restore()
+    if _exit_signal is not None:
+        return 128 + _exit_signal
 
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
@@ -0,0 +1,225 @@
+import random
+import time
+
+import pytest
+
+import gamergamma as gg
+
+
+# ----------------------------
+# SceneSelector
+# ----------------------------
+
+def dark_frame(fraction, shape=(90, 160)):
+    """A grey frame with `fraction` of its pixels below the dark level."""
+    np = pytest.importorskip("numpy")
+    frame = np.full(shape, 200, np.uint8)
+    frame.ravel()[:int(fraction * frame.size)] = 10
+    return frame
+
+
+@pytest.fixture
+def selector():
+    pytest.importorskip("numpy")
+    sel = gg.SceneSelector(hysteresis=0.08, dwell=2)
+    sel.set_presets({"low": {"gamma": 100}, "mid": {"gamma": 150}, "high": {"gamma": 200}})
+    return sel
+
+
+def test_scene_first_frame_picks_its_band(selector):
+    assert selector.update(dark_frame(0.1)) == "low"
+
+
+def test_scene_hysteresis_uses_current_band_edge(selector):
+    selector.update(dark_frame(0.1))
+    # Band 1, but within the margin of band 0's upper edge (1/3)
+    assert [selector.update(dark_frame(0.38)) for _ in range(3)] == [None] * 3
+    # Far past it, into band 2: switches after the dwell
+    assert [selector.update(dark_frame(0.70)) for _ in range(2)] == [None, "high"]
+    # Going down, band 2's lower edge (2/3) is the one that counts
+    assert [selector.update(dark_frame(0.62)) for _ in range(3)] == [None] * 3
+
+
+def test_scene_dwell_counts_alternating_targets(selector):
+    selector.update(dark_frame(0.9))
+    assert selector.update(dark_frame(0.1)) is None
+    assert selector.update(dark_frame(0.5)) == "mid"
+
+
+def test_scene_single_outlier_frame_does_not_switch(selector):
+    selector.update(dark_frame(0.9))
+    for fraction in (0.1, 0.9, 0.1, 0.9):
+        assert selector.update(dark_frame(fraction)) is None
+
+
+# ----------------------------
+# CommandReplay
+# ----------------------------
+
+ARGV = ["ddcutil", "-d", "1", "getvcp", "0x72"]
+
+
+def record_trace(path, count=50):
+    recorder = gg.CommandRecorder(str(path))
+    for i in range(count):
+        recorder.record(ARGV, 0, f"VCP 0x72 C {i}\n", "", 0.001)
+    return recorder
+
+
+def replayed_count(path):
+    replay = gg.CommandReplay(str(path), speed=0)
+    return len(replay._responses[tuple(ARGV)])
+
+
+def test_replay_reads_unclosed_gzip_trace(tmp_path):
+    recorder = record_trace(tmp_path / "session.jsonl.gz")
+    data = (tmp_path / "session.jsonl.gz").read_bytes()  # No gzip trailer yet
+    recorder.close()
+
+    (tmp_path / "crashed.jsonl.gz").write_bytes(data)
+    assert replayed_count(tmp_path / "crashed.jsonl.gz") == 50
+
+    (tmp_path / "cut.jsonl.gz").write_bytes(data[:-20])
+    assert 0 < replayed_count(tmp_path / "cut.jsonl.gz") < 50
+
+
+def test_replay_drops_line_cut_mid_way(tmp_path):
+    record_trace(tmp_path / "session.jsonl").close()
+    data = (tmp_path / "session.jsonl").read_bytes()
+    (tmp_path / "cut.jsonl").write_bytes(data[:-7])
+    assert replayed_count(tmp_path / "cut.jsonl") == 49
+
+
+def test_replay_rejects_corrupt_middle_line(tmp_path):
+    record_trace(tmp_path / "session.jsonl").close()
+    lines = (tmp_path / "session.jsonl").read_text().splitlines(keepends=True)
+    lines[10] = "{not json\n"
+    (tmp_path / "bad.jsonl").write_text("".join(lines))
+    with pytest.raises(ValueError):
+        gg.CommandReplay(str(tmp_path / "bad.jsonl"), speed=0)
+
+
+def test_replay_serves_responses_in_order(tmp_path):
+    record_trace(tmp_path / "session.jsonl", count=3).close()
+    replay = gg.CommandReplay(str(tmp_path / "session.jsonl"), speed=0)
+    outs = [replay.respond(ARGV, None)[1] for _ in range(4)]
+    assert outs == ["VCP 0x72 C 0\n", "VCP 0x72 C 1\n", "VCP 0x72 C 2\n", "VCP 0x72 C 2\n"]
+
+
+# ----------------------------
+# CommandSupervisor
+# ----------------------------
+
+def jittery_supervisor(done):
+    supervisor = gg.CommandSupervisor()
+
+    def spawn(argv, timeout, stderr, text=True):
+        time.sleep(random.random() * 0.005)
+        done.append(argv)
+        return 0, "", ""
+
+    supervisor._spawn = spawn
+    return supervisor
+
+
+def test_submit_keeps_bus_order():
+    for _ in range(20):
+        done = []
+        supervisor = jittery_supervisor(done)
+        writes = [["ddcutil", "-d", "1", "setvcp", "0x72", f"0x{v:02X}00"] for v in range(0x90, 0x96)]
+        futures = [supervisor.submit(argv) for argv in writes]
+        futures.append(supervisor.submit(["nvibrant", "0", "512"]))
+        for future in futures:
+            future.result(timeout=5)
+        assert [argv for argv in done if argv[0] == "ddcutil"] == writes
+        supervisor.shutdown()
+
+
+def test_run_refuses_after_shutdown():
+    done = []
+    supervisor = jittery_supervisor(done)
+    supervisor.shutdown()
+    with pytest.raises(gg.SupervisorClosed):
+        supervisor.run(ARGV)
+    assert supervisor.submit(ARGV).cancelled()
+    assert done == []
+
+
+# ----------------------------
+# Config hot-reload
+# ----------------------------
+
+def presets(**overrides):
+    monitor = {pid: dict(preset) for pid, preset in gg.DEFAULT_PRESETS.items()}
+    for pid, changes in overrides.items():
+        monitor[pid].update(changes)
+    return {"1": monitor}
+
+
+@pytest.fixture
+def isolated_state(monkeypatch):
+    # merge_external_presets() recompiles plans and reloads monitor entries
+    monkeypatch.setattr(gg, "_deps", {})
+    for name in ("_apply_plans", "_monitor_entries", "_ddc_timing", "_exit_restore_plans"):
+        monkeypatch.setattr(gg, name, {})
+
+
+def test_diff_presets_reports_changed_and_new_only():
+    old = presets()
+    new = presets(**{"2": {"gamma": 200}})
+    new["1"]["4"] = dict(gg.DEFAULT_PRESETS["1"])
+    del new["1"]["3"]  # Missing is not deleted
+    assert gg.diff_presets(old, new) == {("1", "2"), ("1", "4")}
+
+
+def test_merge_external_presets_updates_in_place(isolated_state):
+    all_presets = presets()
+    changed = gg.merge_external_presets(all_presets, {"presets": presets(**{"2": {"gamma": 200}})})
+    assert changed == {("1", "2")}
+    assert all_presets["1"]["2"]["gamma"] == 200
+
+
+def test_merge_external_presets_fills_defaults(isolated_state):
+    all_presets = presets()
+    edited = presets()
+    del edited["1"]["1"]["hotkey_mode"]
+    assert gg.merge_external_presets(all_presets, {"presets": edited}) == set()
+
+
+def test_merge_external_presets_skips_bad_edits(isolated_state):
+    all_presets = presets()
+    edited = presets(**{"1": {"gamma": "high"}, "2": {"gamma": 200}, "3": {"vibrance_mode": "sRGB"}})
+    edited["1"]["4"] = {"vibrance": 1}
+    edited["2"] = []
+    changed = gg.merge_external_presets(all_presets, {"presets": edited})
+    assert changed == {("1", "2")}
+    assert all_presets["1"]["1"]["gamma"] == gg.DEFAULT_PRESETS["1"]["gamma"]
+    assert all_presets["1"]["3"]["vibrance_mode"] == gg.DEFAULT_PRESETS["3"]["vibrance_mode"]
+    assert "4" not in all_presets["1"] and "2" not in all_presets
+
+
+# ----------------------------
+# MomentaryHotKey
+# ----------------------------
+
+def test_momentary_hotkey_press_and_release():
+    events = []
+    hotkey = gg.MomentaryHotKey(["alt", "1"], lambda: events.append("down"), lambda: events.append("up"))
+    hotkey.press("alt")
+    assert events == []
+    hotkey.press("1")
+    hotkey.press("1")  # Key repeat
+    assert events == ["down"]
+    hotkey.release("alt")
+    hotkey.release("1")
+    assert events == ["down", "up"]
+
+
+def test_momentary_hotkey_ignores_other_keys():
+    events = []
+    hotkey = gg.MomentaryHotKey(["alt", "1"], lambda: events.append("down"), lambda: events.append("up"))
+    hotkey.press("alt")
+    hotkey.press("2")
+    hotkey.release("2")
+    hotkey.release("alt")
+    assert events == []